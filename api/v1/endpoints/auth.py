@@ -1,12 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Body
 from fastapi.responses import JSONResponse
 import asyncio
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 import models
 import schemas
 import logging
-from datetime import datetime, timedelta, UTC
+from datetime import timedelta
 import auth
 import bcrypt
 from auth import verify_refresh_token, create_access_token, create_refresh_token, revoke_refresh_token
@@ -74,9 +76,9 @@ async def send_password_reset_email(email: str, token: str, first_name: str = No
 async def register(
         user_in: schemas.UserCreate,
         background_tasks: BackgroundTasks,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
-    db_user = db.query(models.User).filter(models.User.email == user_in.email).first()
+    db_user = await db.scalar(select(models.User).where(models.User.email == user_in.email))
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -85,7 +87,7 @@ async def register(
 
     verification_id = str(uuid.uuid4())  # Generate a unique ID
     verification_code = generate_verification_code(6)
-    hashed_password = auth.get_password_hash(user_in.password)
+    hashed_password = await run_in_threadpool(auth.get_password_hash, user_in.password)
 
     db_user = models.User(
         email=user_in.email,
@@ -98,8 +100,8 @@ async def register(
     )
 
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
 
     background_tasks.add_task(
         send_verification_email,
@@ -114,7 +116,7 @@ async def register(
         expires_delta=access_token_expires
     )
 
-    refresh_token = auth.create_refresh_token(user_id=db_user.id, db=db)
+    refresh_token = await auth.create_refresh_token(user_id=db_user.id, db=db)
 
     return JSONResponse(
         status_code=status.HTTP_302_FOUND,
@@ -125,9 +127,9 @@ async def register(
 @router.post("/login", response_model=None)  # Remove the response_model
 async def login(
         credentials: schemas.UserLogin,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(models.User).filter(models.User.email == credentials.email).first()
+    user = await db.scalar(select(models.User).where(models.User.email == credentials.email))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -139,7 +141,8 @@ async def login(
     pwd = credentials.password.encode('utf-8') if isinstance(credentials.password, str) else credentials.password
     hashed = user.hashed_password.encode('utf-8') if isinstance(user.hashed_password, str) else user.hashed_password
 
-    if not bcrypt.checkpw(pwd, hashed):
+    # bcrypt takes ~0.2s of CPU; keep it off the event loop
+    if not await run_in_threadpool(bcrypt.checkpw, pwd, hashed):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -161,7 +164,7 @@ async def login(
         verification_code = generate_verification_code(6)
         user.verification_token = verification_code
         user.verification_id = verification_id
-        db.commit()
+        await db.commit()
 
         # Send verification email
         background_tasks = BackgroundTasks()
@@ -183,8 +186,8 @@ async def login(
 
     # Store OTP in a temporary field (add this field to User model)
     user.otp_code = otp_code
-    user.otp_created_at = datetime.now(UTC)
-    db.commit()
+    user.otp_created_at = models.utcnow()
+    await db.commit()
 
     # Send OTP via email
     background_tasks = BackgroundTasks()
@@ -205,12 +208,12 @@ async def login(
 @router.post("/verify-email")
 async def verify_email(
         verification: schemas.VerifyEmail,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(models.User).filter(
+    user = await db.scalar(select(models.User).where(
         models.User.verification_id == verification.verification_id,
         models.User.verification_token == verification.code
-    ).first()
+    ))
 
     if not user:
         raise HTTPException(
@@ -221,8 +224,8 @@ async def verify_email(
     user.is_verified = True
     user.verification_token = None
     user.verification_id = None
-    user.last_login = datetime.now(UTC)
-    db.commit()
+    user.last_login = models.utcnow()
+    await db.commit()
 
     user_tier = get_user_tier(user)
 
@@ -234,7 +237,7 @@ async def verify_email(
     )
 
     # Create refresh token
-    refresh_token = auth.create_refresh_token(user_id=user.id, db=db)
+    refresh_token = await auth.create_refresh_token(user_id=user.id, db=db)
 
     return {
         "message": "Email verified successfully",
@@ -252,9 +255,9 @@ async def verify_email(
 @router.post("/verify-otp")
 async def verify_otp(
         otp_data: schemas.VerifyOTP,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(models.User).filter(models.User.id == otp_data.user_id).first()
+    user = await db.scalar(select(models.User).where(models.User.id == otp_data.user_id))
 
     if not user:
         raise HTTPException(
@@ -271,7 +274,7 @@ async def verify_otp(
 
     # Check if OTP has expired (10 minutes)
     otp_expiry = user.otp_created_at + timedelta(minutes=10)
-    if datetime.now(UTC) > otp_expiry:
+    if models.utcnow() > otp_expiry:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="OTP has expired"
@@ -280,8 +283,8 @@ async def verify_otp(
     # Clear OTP data
     user.otp_code = None
     user.otp_created_at = None
-    user.last_login = datetime.now(UTC)
-    db.commit()
+    user.last_login = models.utcnow()
+    await db.commit()
 
     user_tier = get_user_tier(user)
 
@@ -293,7 +296,7 @@ async def verify_otp(
     )
 
     # Create refresh token
-    refresh_token = auth.create_refresh_token(user_id=user.id, db=db)
+    refresh_token = await auth.create_refresh_token(user_id=user.id, db=db)
 
     return {
         "message": "OTP verified successfully",
@@ -311,17 +314,17 @@ async def verify_otp(
 async def forgot_password(
         password_reset: schemas.PasswordReset,
         background_tasks: BackgroundTasks,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(models.User).filter(models.User.email == password_reset.email).first()
+    user = await db.scalar(select(models.User).where(models.User.email == password_reset.email))
 
     reset_token = auth.generate_token()
-    reset_token_expires = datetime.now(UTC) + timedelta(hours=24)
+    reset_token_expires = models.utcnow() + timedelta(hours=24)
 
     if user:
         user.reset_token = reset_token
         user.reset_token_expires = reset_token_expires
-        db.commit()
+        await db.commit()
 
         background_tasks.add_task(
             send_password_reset_email,
@@ -338,7 +341,7 @@ async def forgot_password(
 @router.post("/reset-password")
 async def reset_password(
         password_reset: schemas.PasswordResetConfirm,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     if password_reset.new_password != password_reset.confirm_password:
         raise HTTPException(
@@ -346,23 +349,23 @@ async def reset_password(
             detail="Passwords do not match"
         )
 
-    user = db.query(models.User).filter(models.User.reset_token == password_reset.token).first()
+    user = await db.scalar(select(models.User).where(models.User.reset_token == password_reset.token))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid reset token"
         )
 
-    if user.reset_token_expires < datetime.now(UTC):
+    if user.reset_token_expires < models.utcnow():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Reset token has expired"
         )
 
-    user.hashed_password = auth.get_password_hash(password_reset.new_password)
+    user.hashed_password = await run_in_threadpool(auth.get_password_hash, password_reset.new_password)
     user.reset_token = None
     user.reset_token_expires = None
-    db.commit()
+    await db.commit()
 
     return {"message": "Password reset successfully"}
 
@@ -371,9 +374,11 @@ async def reset_password(
 async def change_password(
         password_update: schemas.PasswordUpdate,
         current_user: models.User = Depends(auth.get_current_user),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
-    if not auth.verify_password(password_update.current_password, current_user.hashed_password):
+    if not await run_in_threadpool(
+            auth.verify_password, password_update.current_password, current_user.hashed_password
+    ):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect current password"
@@ -385,8 +390,9 @@ async def change_password(
             detail="Passwords do not match"
         )
 
-    current_user.hashed_password = auth.get_password_hash(password_update.new_password)
-    db.commit()
+    current_user = await db.get(models.User, current_user.id)
+    current_user.hashed_password = await run_in_threadpool(auth.get_password_hash, password_update.new_password)
+    await db.commit()
 
     return {"message": "Password changed successfully"}
 
@@ -400,8 +406,11 @@ async def read_users_me(current_user: models.User = Depends(auth.get_current_use
 async def update_user(
         user_update: schemas.UserUpdate,
         current_user: models.User = Depends(auth.get_current_user),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
+    # get_current_user's session is closed; change the user through this one
+    current_user = await db.get(models.User, current_user.id)
+
     if user_update.first_name is not None:
         current_user.first_name = user_update.first_name
 
@@ -410,7 +419,7 @@ async def update_user(
 
     if user_update.email is not None and user_update.email != current_user.email:
         # Check if email already exists
-        existing_user = db.query(models.User).filter(models.User.email == user_update.email).first()
+        existing_user = await db.scalar(select(models.User).where(models.User.email == user_update.email))
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -425,8 +434,8 @@ async def update_user(
     if user_update.profile_photo is not None:
         current_user.profile_photo = user_update.profile_photo
 
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
 
     return current_user
 
@@ -434,10 +443,11 @@ async def update_user(
 @router.post("/deactivate")
 async def deactivate_account(
         current_user: models.User = Depends(auth.get_current_user),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
+    current_user = await db.get(models.User, current_user.id)
     current_user.is_active = False
-    db.commit()
+    await db.commit()
 
     return {"message": "Account deactivated successfully"}
 
@@ -445,9 +455,9 @@ async def deactivate_account(
 @router.post("/refresh", response_model=schemas.Token)
 async def refresh_access_token(
         refresh_token: str = Body(..., embed=True),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
-    user = verify_refresh_token(refresh_token, db)
+    user = await verify_refresh_token(refresh_token, db)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -463,10 +473,10 @@ async def refresh_access_token(
     )
 
     # Create new refresh token (token rotation for better security)
-    new_refresh_token = create_refresh_token(user_id=user.id, db=db)
+    new_refresh_token = await create_refresh_token(user_id=user.id, db=db)
 
     # Revoke the old refresh token
-    revoke_refresh_token(refresh_token, db)
+    await revoke_refresh_token(refresh_token, db)
 
     return {
         "access_token": access_token,
@@ -478,9 +488,9 @@ async def refresh_access_token(
 @router.post("/logout")
 async def logout(
         refresh_token: str = Body(..., embed=True),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """Revoke refresh token on logout"""
-    success = auth.revoke_refresh_token(refresh_token, db)
+    success = await auth.revoke_refresh_token(refresh_token, db)
 
     return {"message": "Successfully logged out"}
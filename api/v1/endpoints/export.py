@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from database import get_db
-from models import Investor, InvestmentFund
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_read_db
+from datetime import datetime
+from api.v1.endpoints.lists import get_list_members
+import models
 import logging
 from fastapi.responses import StreamingResponse
 import io
@@ -28,17 +30,24 @@ def generate_csv(data, headers):
 @router.get("/lists/{list_id}/export/csv")
 async def export_list_items_csv(
         list_id: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_read_db)
 ):
     """Export items from a specific list to CSV"""
     try:
         # Get the list and verify it exists
-        saved_list = db.query(models.SavedList).filter(models.SavedList.id == list_id).first()
+        saved_list = await db.get(models.SavedList, list_id)
         if not saved_list:
             raise HTTPException(status_code=404, detail="List not found")
 
         # Get list items
-        items = crud.saved_list.get_list_items(db=db, list_id=list_id)
+        if saved_list.list_type.lower() == 'investor':
+            items = await get_list_members(
+                db, list_id, models.Investor, models.saved_investors_association.c.investor_id
+            )
+        else:
+            items = await get_list_members(
+                db, list_id, models.InvestmentFund, models.saved_funds_association.c.fund_id
+            )
         if not items:
             raise HTTPException(status_code=404, detail="No items found in list")
 
@@ -1,14 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
-from datetime import datetime, timedelta, UTC
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import timedelta
 import os
 import requests
 from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
 import logging
 import auth
-from database import get_db
+from database import get_async_db
 import models
 import schemas
 from secrets import token_hex
@@ -52,7 +53,7 @@ async def login_via_google(request: Request):
 @router.get("/callback")
 async def google_auth_callback(
         request: Request,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """Handle Google OAuth callback"""
     try:
@@ -115,7 +116,7 @@ async def google_auth_callback(
             return RedirectResponse(f"{FRONTEND_URL}/auth-error?message=Email+not+found+in+Google+account")
 
         # Check if user exists in the database
-        user = db.query(models.User).filter(models.User.email == email).first()
+        user = await db.scalar(select(models.User).where(models.User.email == email))
 
         if not user:
             # Create a new user if they don't exist
@@ -129,8 +130,8 @@ async def google_auth_callback(
                 profile_photo=id_info.get('picture')
             )
             db.add(user)
-            db.commit()
-            db.refresh(user)
+            await db.commit()
+            await db.refresh(user)
             logger.info(f"Created new user from Google OAuth: {email}")
         elif not user.is_google_auth:
             # Update existing user to indicate they can now use Google auth
@@ -150,13 +151,13 @@ async def google_auth_callback(
             if id_info.get('picture'):
                 user.profile_photo = id_info.get('picture')
 
-            db.commit()
-            db.refresh(user)
+            await db.commit()
+            await db.refresh(user)
             logger.info(f"Updated existing user with Google OAuth: {email}")
 
         # Record the login time
-        user.last_login = datetime.now(UTC)
-        db.commit()
+        user.last_login = models.utcnow()
+        await db.commit()
 
         # Generate JWT token for the user
         access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -1,16 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
 from typing import Optional, List
 import models
 import schemas
-from database import get_db
+from database import get_db, async_read_session, get_async_read_db, get_read_db
+import conditional
 import crud
+import search
+import pagination
+import replicas
+import response_cache
+import serializers
 import logging
+from responses import FastJSONResponse, ndjson_search_stream
+from services.search_index import search_index
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Upper bound on ids per /batch request
+MAX_BATCH_IDS = 1000
+
 
 @router.post("/", response_model=None)
 def create_fund(fund: schemas.InvestmentFundCreate, db: Session = Depends(get_db)):
@@ -20,94 +31,53 @@ def create_fund(fund: schemas.InvestmentFundCreate, db: Session = Depends(get_db
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/bulk", response_model=None)
+def bulk_upsert_funds(request: schemas.BulkUpsertRequest, db: Session = Depends(get_db)):
+    """Insert or update up to 10,000 funds in one transaction, keyed on email or external_id"""
+    try:
+        return FastJSONResponse(crud.investment_fund.bulk_upsert(db, request.records, schemas.InvestmentFundBulkRecord, request.key))
+    except Exception as e:
+        logger.error(f"Error bulk upserting funds: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/", response_model=None)
 def read_funds(
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         page: int = Query(1, gt=0, description="Page number"),
-        per_page: int = Query(50, gt=0, le=100, description="Items per page")
+        per_page: int = Query(50, gt=0, le=100, description="Items per page"),
+        cursor: Optional[str] = Query(None, description="next_cursor of the previous page; overrides page")
 ):
     try:
-        total = db.query(models.InvestmentFund).count()
-        skip = (page - 1) * per_page
-        funds = crud.investment_fund.get_multi(
-            db=db,
-            skip=skip,
-            limit=per_page
+        plan = search.SearchPlan(models.InvestmentFund, {})
+        funds, next_cursor, total = pagination.fetch_counted_page(
+            db, plan, schemas.CountMode.EXACT, (), per_page, skip=(page - 1) * per_page, cursor=cursor
         )
-        return {
+        return FastJSONResponse({
             "total": total,
-            "page": page,
+            "page": None if cursor else page,
             "per_page": per_page,
             "total_pages": -(-total // per_page),
-            "results": funds
-        }
+            "next_cursor": next_cursor,
+            "results": serializers.investment_fund.many(funds),
+        })
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching funds: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def apply_contact_filters(query, email=None, phone=None, address=None):
-    if email:
-        if email.lower() == "has_email":
-            query = query.filter(models.Investor.email.isnot(None), models.Investor.email != 'NaN')
-        elif email.lower() == "no_email":
-            query = query.filter(or_(models.Investor.email.is_(None), models.Investor.email == 'NaN'))
-
-    if phone:
-        if phone.lower() == "has_phone":
-            query = query.filter(models.Investor.phone.isnot(None), models.Investor.phone != 'NaN')
-        elif phone.lower() == "no_phone":
-            query = query.filter(or_(models.Investor.phone.is_(None), models.Investor.phone == 'NaN'))
-
-    if address:
-        if address.lower() == "has_address":
-            query = query.filter(models.Investor.address.isnot(None), models.Investor.address != 'NaN')
-        elif address.lower() == "no_address":
-            query = query.filter(or_(models.Investor.address.is_(None), models.Investor.address == 'NaN'))
-
-    return query
-
-
-def string_to_float(value: str) -> tuple[float, float]:
-    if not value:
-        return 0, float('inf')
-
-    ranges = {
-
-        "$1B+": (1_000_000_000, float('inf')),
-
-
-        "$100M - $500M": (100_000_000, 500_000_000),
-        "$500M - $1B": (500_000_000, 1_000_000_000),
-        "$25M - $100M": (25_000_000, 100_000_000),
-        "$0 - $25M": (1, 25_000_000),
-        "$10M - $25M": (10_000_000, 25_000_000),
-        "$100M+": (100_000_000, float('inf')),
-        "$1M - $10M": (1_000_000, 10_000_000),
-        "$0 - $1M": (1, 1_000_000),
-        "$5M - $20M": (5_000_000, 20_000_000),
-        "$20M+": (20_000_000, float('inf')),
-        "$1M - $5M": (1_000_000, 5_000_000),
-
-
-        "$250K - $1M": (250_000, 1_000_000),
-        "$0 - $250K": (0, 250_000),
-
-
-        "1 - 10": (1, 9.99),
-        "10 - 20": (10, 19.99),
-        "20 - 30": (20, 29.99),
-        "30 - 40": (30, 40)
-    }
-
-    return ranges.get(value, (0, float('inf')))
-
-
 @router.get("/search")
 async def search_funds_get(
+        request: Request,
         search_term: Optional[str] = None,
+        search_mode: schemas.SearchMode = Query(schemas.SearchMode.CONTAINS),
         page: int = Query(1, gt=0),
         per_page: int = Query(50, gt=1, le=100),
+        cursor: Optional[str] = Query(None, description="next_cursor of the previous page; overrides page"),
+        count_mode: schemas.CountMode = Query(schemas.CountMode.EXACT, description="How the total is computed"),
+        fields: Optional[List[str]] = Query(None, description="Columns to return, e.g. fields=id,firm_name,city"),
         email: Optional[str] = Query(None),
         phone: Optional[str] = Query(None),
         address: Optional[str] = Query(None),
@@ -122,120 +92,190 @@ async def search_funds_get(
         minimum_investment: Optional[List[str]] = Query(None),
         maximum_investment: Optional[List[str]] = Query(None),
         number_of_investors: Optional[List[str]] = Query(None),
-        gender_ratio: Optional[List[str]] = Query(None),
-        db: Session = Depends(get_db)
+        gender_ratio: Optional[List[str]] = Query(None)
 ):
     """Search investment funds using query parameters"""
     try:
-        query = db.query(models.InvestmentFund)
-
-        if search_term:
-            search = f"%{search_term}%"
-            query = query.filter(
-                models.InvestmentFund.firm_name.ilike(search) |
-                models.InvestmentFund.contact_email.ilike(search) |
-                models.InvestmentFund.firm_email.ilike(search)
-            )
-
-        query = apply_contact_filters(query, email, phone, address)
-
-        if cities:
-            query = query.filter(models.InvestmentFund.firm_city.in_(cities))
-        if states:
-            query = query.filter(models.InvestmentFund.firm_state.in_(states))
-        if countries:
-            query = query.filter(models.InvestmentFund.firm_country.in_(countries))
-        if location_preferences:
-            query = query.filter(models.InvestmentFund.geographic_preferences.overlap([location_preferences]))
-        if industries:
-            query = query.filter(models.InvestmentFund.industry_preferences.overlap(industries))
-
-        if fund_types:
-            query = query.filter(models.InvestmentFund.firm_type.in_(fund_types))
-
-        if stages:
-            query = query.filter(models.InvestmentFund.stage_preferences.overlap(stages))
-        if assets_under_management:
-            conditions = []
-            for range_value in assets_under_management:
-                lower, upper = string_to_float(range_value)
-                conditions.append(
-                    and_(
-                        models.InvestmentFund.capital_managed >= lower,
-                        models.InvestmentFund.capital_managed <= upper
-                    )
-                )
-            if conditions:
-                query = query.filter(or_(*conditions))
-
-        if minimum_investment:
-            conditions = []
-            for range_value in minimum_investment:
-                lower, upper = string_to_float(range_value)
-                conditions.append(
-                    and_(
-                        models.InvestmentFund.min_investment >= lower,
-                        models.InvestmentFund.min_investment <= upper
-                    )
-                )
-            if conditions:
-                query = query.filter(or_(*conditions))
-        if maximum_investment:
-            conditions = []
-            for range_value in maximum_investment:
-                lower, upper = string_to_float(range_value)
-                conditions.append(
-                    and_(
-                        models.InvestmentFund.max_investment >= lower,
-                        models.InvestmentFund.max_investment <= upper
-                    )
+        filters = dict(
+            search_term=search_term, search_mode=search_mode, email=email, phone=phone, address=address,
+            cities=cities, states=states, countries=countries, location_preferences=location_preferences,
+            industries=industries, fund_types=fund_types, stages=stages,
+            assets_under_management=assets_under_management, minimum_investment=minimum_investment,
+            maximum_investment=maximum_investment, number_of_investors=number_of_investors,
+            gender_ratio=gender_ratio
+        )
+
+        fields = crud.investment_fund.resolve_fields(fields)
+        key = response_cache.cache_key(
+            models.InvestmentFund,
+            dict(filters, page=page, per_page=per_page, cursor=cursor, count_mode=count_mode, fields=fields)
+        )
+        cached = response_cache.get(key, request)
+        if cached is not None:
+            return cached
+
+        hit = None
+        # The index, like the cache, may not have seen another worker's write yet
+        if search_mode != schemas.SearchMode.FULLTEXT and replicas.read_after(request) is None:
+            hit = search_index.search(models.InvestmentFund, filters, page, per_page, cursor)
+        if hit is None:
+            plan = search.SearchPlan(models.InvestmentFund, filters, fields)
+            signature = pagination.filter_signature(filters)
+
+        # Opened only on a cache miss, so a hit takes no connection
+        async with async_read_session(request) as db:
+            if hit is not None:
+                # The index yields ids and an exact total; the rows are one primary-key lookup
+                results, _ = await db.run_sync(crud.investment_fund.get_many, hit["ids"], fields)
+                total, next_cursor, counted = hit["total"], hit["next_cursor"], schemas.CountMode.EXACT
+            else:
+                # The page helpers are synchronous; run_sync drives them over asyncpg without blocking the loop
+                rows, next_cursor, total = await db.run_sync(
+                    pagination.fetch_counted_page, plan, count_mode, signature, per_page, skip=(page - 1) * per_page,
+                    cursor=cursor
                 )
-            if conditions:
-                query = query.filter(or_(*conditions))
-        if number_of_investors:
-            conditions = []
-            for range_value in number_of_investors:
-                try:
-                    lower, upper = string_to_float(range_value)
-                    conditions.append(
-                        and_(
-                            models.InvestmentFund.number_of_investors >= lower,
-                            models.InvestmentFund.number_of_investors <= upper
-                        )
-                    )
-                except Exception as e:
-                    logger.error(f"Error parsing number_of_investors range: {e}")
-                    continue
-            if conditions:
-                query = query.filter(or_(*conditions))
-        if gender_ratio:
-            gender_ratios = gender_ratio if isinstance(gender_ratio, list) else [gender_ratio]
-            query = query.filter(models.InvestmentFund.gender_ratio.in_(gender_ratios))
-
-        total = query.count()
-        skip = (page - 1) * per_page
-        results = query.offset(skip).limit(per_page).all()
-
-        return {
-            "total": total,
-            "page": page,
-            "per_page": per_page,
-            "total_pages": -(-total // per_page),
-            "results": [crud.investment_fund.to_dict(r) for r in results]
-        }
+                results = serializers.get_serializer(models.InvestmentFund, fields).many(rows)
+                counted = count_mode
+            content = {
+                "total": total,
+                "page": None if cursor else page,
+                "per_page": per_page,
+                "total_pages": -(-total // per_page),
+                "count_mode": counted.value,
+                "next_cursor": next_cursor,
+                "results": results
+            }
+            cacheable = replicas.served_by_primary(db)
+        return response_cache.store(key, content, cacheable)
 
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error searching investment funds: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/stream", response_model=None)
+def stream_funds(
+        request: Request,
+        search_term: Optional[str] = None,
+        search_mode: schemas.SearchMode = Query(schemas.SearchMode.CONTAINS),
+        fields: Optional[List[str]] = Query(None, description="Columns to return, e.g. fields=id,firm_name,city"),
+        email: Optional[str] = Query(None),
+        phone: Optional[str] = Query(None),
+        address: Optional[str] = Query(None),
+        cities: Optional[List[str]] = Query(None),
+        states: Optional[List[str]] = Query(None),
+        countries: Optional[List[str]] = Query(None),
+        location_preferences: Optional[list[str]] = Query(None),
+        industries: Optional[List[str]] = Query(None),
+        fund_types: Optional[List[str]] = Query(None),
+        stages: Optional[List[str]] = Query(None),
+        assets_under_management: Optional[List[str]] = Query(None),
+        minimum_investment: Optional[List[str]] = Query(None),
+        maximum_investment: Optional[List[str]] = Query(None),
+        number_of_investors: Optional[List[str]] = Query(None),
+        gender_ratio: Optional[List[str]] = Query(None)
+):
+    """Every investment fund matching the /search filters as newline-delimited JSON, one object per line.
+    Rows are read with a server-side cursor, so memory use does not grow with the result size"""
+    try:
+        filters = dict(
+            search_term=search_term, search_mode=search_mode, email=email, phone=phone, address=address,
+            cities=cities, states=states, countries=countries, location_preferences=location_preferences,
+            industries=industries, fund_types=fund_types, stages=stages,
+            assets_under_management=assets_under_management, minimum_investment=minimum_investment,
+            maximum_investment=maximum_investment, number_of_investors=number_of_investors,
+            gender_ratio=gender_ratio
+        )
+
+        plan = search.SearchPlan(models.InvestmentFund, filters, crud.investment_fund.resolve_fields(fields))
+        return ndjson_search_stream(plan, request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error streaming investment funds: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def fetch_funds_batch(db: Session, ids: List[int], fields: Optional[List[str]]):
+    if len(ids) > MAX_BATCH_IDS:
+        raise ValueError(f"At most {MAX_BATCH_IDS} ids per batch")
+    results, missing = crud.investment_fund.get_many(db, ids, fields)
+    return FastJSONResponse({"count": len(results), "missing": missing, "results": results})
+
+
+@router.get("/batch", response_model=None)
+def read_funds_batch(
+        ids: List[str] = Query(..., description="Ids to fetch, repeated and/or comma-separated"),
+        fields: Optional[List[str]] = Query(None, description="Columns to return, e.g. fields=id,firm_name,city"),
+        db: Session = Depends(get_read_db)
+):
+    """Fetch many funds by id in one query; results follow the request order"""
+    try:
+        parsed = [int(value) for entry in ids for value in entry.split(',') if value.strip()]
+        return fetch_funds_batch(db, parsed, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error batch fetching funds: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/batch", response_model=None)
+def read_funds_batch_post(request: schemas.BatchFetchRequest, db: Session = Depends(get_read_db)):
+    """Same as GET /batch, for id lists too long for a query string"""
+    try:
+        return fetch_funds_batch(db, request.ids, request.fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error batch fetching funds: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/suggest", response_model=None)
+def suggest_funds(
+        q: str = Query(..., min_length=2, max_length=100, description="Partial firm or contact name"),
+        limit: int = Query(10, gt=0, le=25),
+        db: Session = Depends(get_read_db)
+):
+    """Autocomplete fund firm and contact names, tolerating typos"""
+    try:
+        results = search.suggest_names(
+            db,
+            models.InvestmentFund,
+            {"firm": models.InvestmentFund.firm_name, "person": models.InvestmentFund.full_name},
+            q,
+            limit
+        )
+        return {"query": q, "results": results}
+    except Exception as e:
+        logger.error(f"Error suggesting investment funds: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/{fund_id}", response_model=None)
-def read_fund(fund_id: int, db: Session = Depends(get_db)):
+async def read_fund(fund_id: int, request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    """One fund, with ETag and Last-Modified. A conditional request whose copy is
+    current gets a 304 from a version lookup, without loading the row"""
     try:
-        db_fund = crud.investment_fund.get(db, id=fund_id)
+        # Over asyncpg both lookups reuse the connection's prepared statements (DB_PREPARED_STATEMENTS)
+        if conditional.is_conditional(request):
+            current = await db.run_sync(crud.investment_fund.get_version, fund_id)
+            if current is None:
+                raise HTTPException(status_code=404, detail="Investment Fund not found")
+            if conditional.not_modified(request, current.version, current.updated_at):
+                return Response(status_code=304, headers=conditional.validator_headers(*current))
+
+        db_fund = await db.run_sync(crud.investment_fund.get, fund_id)
         if db_fund is None:
             raise HTTPException(status_code=404, detail="Investment Fund not found")
-        return db_fund
+        return FastJSONResponse(
+            db_fund, headers=conditional.validator_headers(db_fund["version"], db_fund["updated_at"])
+        )
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
@@ -253,6 +293,20 @@ def update_fund(fund_id: int, fund: schemas.InvestmentFundCreate, db: Session =
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.patch("/{fund_id}", response_model=None)
+def patch_fund(fund_id: int, fund: schemas.InvestmentFundUpdate, db: Session = Depends(get_db)):
+    """Partial update: only the fields present in the body are written"""
+    try:
+        db_fund = crud.investment_fund.update(db, id=fund_id, obj_in=fund)
+        if db_fund is None:
+            raise HTTPException(status_code=404, detail="Investment Fund not found")
+        return db_fund
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.delete("/{fund_id}", response_model=None)
 def delete_fund(fund_id: int, db: Session = Depends(get_db)):
     try:
@@ -1,16 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
-from typing import Optional, List, Union
+from typing import Optional, List
 import models
 import schemas
-from database import get_db
+from database import get_db, async_read_session, get_async_read_db, get_read_db
+import conditional
 import crud
+import search
+import pagination
+import replicas
+import response_cache
+import serializers
 import logging
+from responses import FastJSONResponse, ndjson_search_stream
+from services.search_index import search_index
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Upper bound on ids per /batch request
+MAX_BATCH_IDS = 1000
+
 
 @router.post("/", response_model=None)
 def create_investor(investor: schemas.InvestorCreate, db: Session = Depends(get_db)):
@@ -20,27 +31,38 @@ def create_investor(investor: schemas.InvestorCreate, db: Session = Depends(get_
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/bulk", response_model=None)
+def bulk_upsert_investors(request: schemas.BulkUpsertRequest, db: Session = Depends(get_db)):
+    """Insert or update up to 10,000 investors in one transaction, keyed on email or external_id"""
+    try:
+        return FastJSONResponse(crud.investor.bulk_upsert(db, request.records, schemas.InvestorBulkRecord, request.key))
+    except Exception as e:
+        logger.error(f"Error bulk upserting investors: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/", response_model=None)
 def read_investors(
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         page: int = Query(1, gt=0, description="Page number"),
         per_page: int = Query(50, gt=0, le=100, description="Number of items per page"),
+        cursor: Optional[str] = Query(None, description="next_cursor of the previous page; overrides page"),
 ):
     try:
-        total = db.query(models.Investor).count()
-        skip = (page - 1) * per_page
-        investors = crud.investor.get_multi(
-            db=db,
-            skip=skip,
-            limit=per_page,
+        plan = search.SearchPlan(models.Investor, {})
+        investors, next_cursor, total = pagination.fetch_counted_page(
+            db, plan, schemas.CountMode.EXACT, (), per_page, skip=(page - 1) * per_page, cursor=cursor
         )
-        return {
+        return FastJSONResponse({
             "total": total,
-            "page": page,
+            "page": None if cursor else page,
             "per_page": per_page,
             "total_pages": -(-total // per_page),
-            "results": investors,
-        }
+            "next_cursor": next_cursor,
+            "results": serializers.investor.many(investors),
+        })
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching investors: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -54,72 +76,16 @@ def normalize_enum_value(value: str) -> str:
     return value
 
 
-def string_to_float(value: str):
-    if value == "$1B+":
-        return 1000000000, float('inf')
-    if value == "$100M - $500M":
-        return 100000000, 500000000
-    if value == "$500M - $1B":
-        return 500000000, 1000000000
-    if value == "$25M - $100M":
-        return 25000000, 100000000
-    if value == "$0 - $25M":
-        return 1, 25000000
-    if value == "$10M - $25M":
-        return 10000000, 25000000
-    if value == "$100M+":
-        return 100000000, float('inf')
-    if value == "$1M - $10M":
-        return 1000000, 10000000
-    if value == "$0 - $1M":
-        return 1, 1000000
-    if value == "$5M - $20M":
-        return 5000000, 20000000
-    if value == "$20M+":
-        return 20000000, float('inf')
-    if value == "$1M - $5M":
-        return 1000000, 5000000
-    if value == "$250K - $1M":
-        return 250000, 1000000
-    if value == "$0 - $250K":
-        return 0, 250000
-    if value == "1 - 10":
-        return 1, 9.99
-    if value == "10 - 20":
-        return 10, 19.99
-    if value == "20 - 30":
-        return 20, 29.99
-    if value == "30 - 40":
-        return 30, 40
-
-
-def apply_contact_filters(query, email=None, phone=None, address=None):
-    if email:
-        if email.lower() == "has_email":
-            query = query.filter(models.Investor.email.isnot(None), models.Investor.email != 'NaN')
-        elif email.lower() == "no_email":
-            query = query.filter(or_(models.Investor.email.is_(None), models.Investor.email == 'NaN'))
-
-    if phone:
-        if phone.lower() == "has_phone":
-            query = query.filter(models.Investor.phone.isnot(None), models.Investor.phone != 'NaN')
-        elif phone.lower() == "no_phone":
-            query = query.filter(or_(models.Investor.phone.is_(None), models.Investor.phone == 'NaN'))
-
-    if address:
-        if address.lower() == "has_address":
-            query = query.filter(models.Investor.address.isnot(None), models.Investor.address != 'NaN')
-        elif address.lower() == "no_address":
-            query = query.filter(or_(models.Investor.address.is_(None), models.Investor.address == 'NaN'))
-
-    return query
-
-
 @router.get("/search")
 async def search_investors_get(
+        request: Request,
         search_term: Optional[str] = None,
+        search_mode: schemas.SearchMode = Query(schemas.SearchMode.CONTAINS),
         page: int = Query(1, gt=0),
         per_page: int = Query(50, gt=1, le=100),
+        cursor: Optional[str] = Query(None, description="next_cursor of the previous page; overrides page"),
+        count_mode: schemas.CountMode = Query(schemas.CountMode.EXACT, description="How the total is computed"),
+        fields: Optional[List[str]] = Query(None, description="Columns to return, e.g. fields=id,firm_name,city"),
         email: Optional[str] = Query(None),
         phone: Optional[str] = Query(None),
         address: Optional[str] = Query(None),
@@ -135,112 +101,190 @@ async def search_investors_get(
         maximum_investment: Optional[List[str]] = Query(None),
         title: Optional[List[str]] = Query(None),
         number_of_investors: Optional[List[str]] = Query(None),
-        gender: Optional[str] = Query(None),
-        db: Session = Depends(get_db)
+        gender: Optional[str] = Query(None)
 ):
     try:
-        query = db.query(models.Investor)
-
-        if search_term:
-            search = f"%{search_term}%"
-            query = query.filter(
-                models.Investor.first_name.ilike(search) |
-                models.Investor.last_name.ilike(search) |
-                models.Investor.firm_name.ilike(search)
-            )
-
-        query = apply_contact_filters(query, email, phone, address)
-
-        if cities:
-            query = query.filter(models.Investor.city.in_(cities))
-        if gender:
-            query = query.filter(models.Investor.gender == gender)
-        if states:
-            query = query.filter(models.Investor.state.in_(states))
-
-        if countries:
-            query = query.filter(models.Investor.country.in_(countries))
-
-        if industries:
-            query = query.filter(models.Investor.industry_preferences.overlap(industries))
-
-        if fund_types:
-            query = query.filter(models.Investor.type_of_firm.in_(fund_types))
-
-        if stages:
-            query = query.filter(models.Investor.stage_preferences.overlap(stages))
-
-        if geographic_preferences:
-            query = query.filter(models.Investor.geographic_preferences.overlap(geographic_preferences))
-
-        if assets_under_management:
-            conditions = []
-            for range_value in assets_under_management:
-                lower, upper = string_to_float(range_value)
-                conditions.append(models.Investor.capital_managed.between(lower, upper))
-            if conditions:
-                query = query.filter(or_(*conditions))
-
-        if minimum_investment:
-            conditions = []
-            for range_value in minimum_investment:
-                lower, upper = string_to_float(range_value)
-                conditions.append(models.Investor.min_investment.between(lower, upper))
-            if conditions:
-                query = query.filter(or_(*conditions))
-
-        if maximum_investment:
-            conditions = []
-            for range_value in maximum_investment:
-                lower, upper = string_to_float(range_value)
-                conditions.append(models.Investor.max_investment.between(lower, upper))
-            if conditions:
-                query = query.filter(or_(*conditions))
-
-        if title:
-            query = query.filter(models.Investor.contact_title.in_(title if isinstance(title, list) else [title]))
-
-        if number_of_investors:
-            conditions = []
-            for range_value in number_of_investors:
-                try:
-                    lower, upper = string_to_float(range_value)
-                    conditions.append(
-                        and_(
-                            models.Investor.number_of_investors >= lower,
-                            models.Investor.number_of_investors <= upper
-                        )
-                    )
-                except Exception as e:
-                    logger.error(f"Error parsing number_of_investors range: {e}")
-                    continue
-            if conditions:
-                query = query.filter(or_(*conditions))
-
-        total = query.count()
-        skip = (page - 1) * per_page
-        results = query.offset(skip).limit(per_page).all()
-
-        return {
-            "total": total,
-            "page": page,
-            "per_page": per_page,
-            "total_pages": -(-total // per_page),
-            "results": [crud.investor.to_dict(r) for r in results]
-        }
+        filters = dict(
+            search_term=search_term, search_mode=search_mode, email=email, phone=phone, address=address,
+            cities=cities, states=states, countries=countries, industries=industries,
+            geographic_preferences=geographic_preferences, fund_types=fund_types, stages=stages,
+            assets_under_management=assets_under_management, minimum_investment=minimum_investment,
+            maximum_investment=maximum_investment, title=title, number_of_investors=number_of_investors,
+            gender=gender
+        )
+
+        fields = crud.investor.resolve_fields(fields)
+        key = response_cache.cache_key(
+            models.Investor,
+            dict(filters, page=page, per_page=per_page, cursor=cursor, count_mode=count_mode, fields=fields)
+        )
+        cached = response_cache.get(key, request)
+        if cached is not None:
+            return cached
+
+        hit = None
+        # The index, like the cache, may not have seen another worker's write yet
+        if search_mode != schemas.SearchMode.FULLTEXT and replicas.read_after(request) is None:
+            hit = search_index.search(models.Investor, filters, page, per_page, cursor)
+        if hit is None:
+            plan = search.SearchPlan(models.Investor, filters, fields)
+            signature = pagination.filter_signature(filters)
+
+        # Opened only on a cache miss, so a hit takes no connection
+        async with async_read_session(request) as db:
+            if hit is not None:
+                # The index yields ids and an exact total; the rows are one primary-key lookup
+                results, _ = await db.run_sync(crud.investor.get_many, hit["ids"], fields)
+                total, next_cursor, counted = hit["total"], hit["next_cursor"], schemas.CountMode.EXACT
+            else:
+                # The page helpers are synchronous; run_sync drives them over asyncpg without blocking the loop
+                rows, next_cursor, total = await db.run_sync(
+                    pagination.fetch_counted_page, plan, count_mode, signature, per_page, skip=(page - 1) * per_page,
+                    cursor=cursor
+                )
+                results = serializers.get_serializer(models.Investor, fields).many(rows)
+                counted = count_mode
+            content = {
+                "total": total,
+                "page": None if cursor else page,
+                "per_page": per_page,
+                "total_pages": -(-total // per_page),
+                "count_mode": counted.value,
+                "next_cursor": next_cursor,
+                "results": results
+            }
+            cacheable = replicas.served_by_primary(db)
+        return response_cache.store(key, content, cacheable)
 
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error searching investors: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/stream", response_model=None)
+def stream_investors(
+        request: Request,
+        search_term: Optional[str] = None,
+        search_mode: schemas.SearchMode = Query(schemas.SearchMode.CONTAINS),
+        fields: Optional[List[str]] = Query(None, description="Columns to return, e.g. fields=id,firm_name,city"),
+        email: Optional[str] = Query(None),
+        phone: Optional[str] = Query(None),
+        address: Optional[str] = Query(None),
+        cities: Optional[List[str]] = Query(None),
+        states: Optional[List[str]] = Query(None),
+        countries: Optional[List[str]] = Query(None),
+        industries: Optional[List[str]] = Query(None),
+        geographic_preferences: Optional[List[str]] = Query(None),
+        fund_types: Optional[List[str]] = Query(None),
+        stages: Optional[List[str]] = Query(None),
+        assets_under_management: Optional[List[str]] = Query(None),
+        minimum_investment: Optional[List[str]] = Query(None),
+        maximum_investment: Optional[List[str]] = Query(None),
+        title: Optional[List[str]] = Query(None),
+        number_of_investors: Optional[List[str]] = Query(None),
+        gender: Optional[str] = Query(None)
+):
+    """Every investor matching the /search filters as newline-delimited JSON, one object per line.
+    Rows are read with a server-side cursor, so memory use does not grow with the result size"""
+    try:
+        filters = dict(
+            search_term=search_term, search_mode=search_mode, email=email, phone=phone, address=address,
+            cities=cities, states=states, countries=countries, industries=industries,
+            geographic_preferences=geographic_preferences, fund_types=fund_types, stages=stages,
+            assets_under_management=assets_under_management, minimum_investment=minimum_investment,
+            maximum_investment=maximum_investment, title=title, number_of_investors=number_of_investors,
+            gender=gender
+        )
+
+        plan = search.SearchPlan(models.Investor, filters, crud.investor.resolve_fields(fields))
+        return ndjson_search_stream(plan, request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error streaming investors: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def fetch_investors_batch(db: Session, ids: List[int], fields: Optional[List[str]]):
+    if len(ids) > MAX_BATCH_IDS:
+        raise ValueError(f"At most {MAX_BATCH_IDS} ids per batch")
+    results, missing = crud.investor.get_many(db, ids, fields)
+    return FastJSONResponse({"count": len(results), "missing": missing, "results": results})
+
+
+@router.get("/batch", response_model=None)
+def read_investors_batch(
+        ids: List[str] = Query(..., description="Ids to fetch, repeated and/or comma-separated"),
+        fields: Optional[List[str]] = Query(None, description="Columns to return, e.g. fields=id,firm_name,city"),
+        db: Session = Depends(get_read_db)
+):
+    """Fetch many investors by id in one query; results follow the request order"""
+    try:
+        parsed = [int(value) for entry in ids for value in entry.split(',') if value.strip()]
+        return fetch_investors_batch(db, parsed, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error batch fetching investors: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/batch", response_model=None)
+def read_investors_batch_post(request: schemas.BatchFetchRequest, db: Session = Depends(get_read_db)):
+    """Same as GET /batch, for id lists too long for a query string"""
+    try:
+        return fetch_investors_batch(db, request.ids, request.fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error batch fetching investors: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/suggest", response_model=None)
+def suggest_investors(
+        q: str = Query(..., min_length=2, max_length=100, description="Partial firm or contact name"),
+        limit: int = Query(10, gt=0, le=25),
+        db: Session = Depends(get_read_db)
+):
+    """Autocomplete firm and contact names, tolerating typos"""
+    try:
+        results = search.suggest_names(
+            db,
+            models.Investor,
+            {"firm": models.Investor.firm_name, "person": models.Investor.full_name},
+            q,
+            limit
+        )
+        return {"query": q, "results": results}
+    except Exception as e:
+        logger.error(f"Error suggesting investors: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/{investor_id}", response_model=None)
-def read_investor(investor_id: int, db: Session = Depends(get_db)):
+async def read_investor(investor_id: int, request: Request, db: AsyncSession = Depends(get_async_read_db)):
+    """One investor, with ETag and Last-Modified. A conditional request whose copy is
+    current gets a 304 from a version lookup, without loading the row"""
     try:
-        db_investor = crud.investor.get(db, id=investor_id)
+        # Over asyncpg both lookups reuse the connection's prepared statements (DB_PREPARED_STATEMENTS)
+        if conditional.is_conditional(request):
+            current = await db.run_sync(crud.investor.get_version, investor_id)
+            if current is None:
+                raise HTTPException(status_code=404, detail="Investor not found")
+            if conditional.not_modified(request, current.version, current.updated_at):
+                return Response(status_code=304, headers=conditional.validator_headers(*current))
+
+        db_investor = await db.run_sync(crud.investor.get, investor_id)
         if db_investor is None:
             raise HTTPException(status_code=404, detail="Investor not found")
-        return db_investor
+        return FastJSONResponse(
+            db_investor, headers=conditional.validator_headers(db_investor["version"], db_investor["updated_at"])
+        )
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
@@ -258,6 +302,20 @@ def update_investor(investor_id: int, investor: schemas.InvestorCreate, db: Sess
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.patch("/{investor_id}", response_model=None)
+def patch_investor(investor_id: int, investor: schemas.InvestorUpdate, db: Session = Depends(get_db)):
+    """Partial update: only the fields present in the body are written"""
+    try:
+        db_investor = crud.investor.update(db, id=investor_id, obj_in=investor)
+        if db_investor is None:
+            raise HTTPException(status_code=404, detail="Investor not found")
+        return db_investor
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.delete("/{investor_id}", response_model=None)
 def delete_investor(investor_id: int, db: Session = Depends(get_db)):
     try:
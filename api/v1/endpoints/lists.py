@@ -1,15 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 from typing import List
 import models
 import schemas
-from database import get_db
+from database import get_db, get_async_db, get_async_read_db, get_read_db
 import crud
+import serializers
 import logging
 from datetime import datetime
 import io
 import csv
+from responses import FastJSONResponse
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -26,7 +30,7 @@ def create_list(
 
 @router.get("/", response_model=List[schemas.SavedList])
 def get_all_lists(
-        db: Session = Depends(get_db),
+        db: Session = Depends(get_read_db),
         skip: int = 0,
         limit: int = 100
 ):
@@ -86,67 +90,63 @@ def remove_fund_from_list(
     return {"status": "success"}
 
 
+async def get_list_members(db: AsyncSession, list_id: int, model, member_column) -> List[dict]:
+    """Serialized members of a saved list, selected as plain rows in id order"""
+    serializer = serializers.get_serializer(model)
+    member_ids = select(member_column).where(member_column.table.c.list_id == list_id)
+    stmt = (
+        select(*[getattr(model, name) for name in serializer.fields])
+        .where(model.id.in_(member_ids))
+        .order_by(model.id)
+    )
+    return [serializer(row) for row in (await db.execute(stmt)).mappings()]
+
+
+async def load_list_items(db: AsyncSession, list_id: int) -> dict:
+    """Both investors and funds of a saved list; raises 404 if the list does not exist"""
+    saved_list = await db.get(models.SavedList, list_id)
+    if not saved_list:
+        logger.error(f"List with id {list_id} not found")
+        raise HTTPException(status_code=404, detail="List not found")
+
+    investors = await get_list_members(db, list_id, models.Investor, models.saved_investors_association.c.investor_id)
+    logger.info(f"Found {len(investors)} investors")
+    funds = await get_list_members(db, list_id, models.InvestmentFund, models.saved_funds_association.c.fund_id)
+    logger.info(f"Found {len(funds)} funds")
+
+    # Combine both types of items into a single response
+    return {
+        "list_id": list_id,
+        "list_name": saved_list.name,
+        "list_type": saved_list.list_type,
+        "total_items": len(investors) + len(funds),
+        "items": {
+            "investors": {
+                "count": len(investors),
+                "data": investors
+            },
+            "funds": {
+                "count": len(funds),
+                "data": funds
+            }
+        }
+    }
+
+
 @router.get("/{list_id}/items", response_model=None)
 async def get_list_items_combined(
         list_id: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get all items in a saved list, including both investors and funds"""
     try:
         logger.info(f"Retrieving items for list {list_id}")
-
-        # Get the list with all relationships loaded
-        saved_list = db.query(models.SavedList) \
-            .options(joinedload(models.SavedList.saved_investors)) \
-            .options(joinedload(models.SavedList.saved_funds)) \
-            .filter(models.SavedList.id == list_id) \
-            .first()
-
-        if not saved_list:
-            logger.error(f"List with id {list_id} not found")
-            raise HTTPException(status_code=404, detail="List not found")
-
-        # Get investors if any exist
-        investors = []
-        if saved_list.saved_investors:
-            investor_ids = [inv.id for inv in saved_list.saved_investors]
-            db_investors = db.query(models.Investor) \
-                .filter(models.Investor.id.in_(investor_ids)) \
-                .all()
-            investors = [crud.investor.to_dict(inv) for inv in db_investors]
-            logger.info(f"Found {len(investors)} investors")
-
-        # Get funds if any exist
-        funds = []
-        if saved_list.saved_funds:
-            fund_ids = [fund.id for fund in saved_list.saved_funds]
-            db_funds = db.query(models.InvestmentFund) \
-                .filter(models.InvestmentFund.id.in_(fund_ids)) \
-                .all()
-            funds = [crud.investment_fund.to_dict(fund) for fund in db_funds]
-            logger.info(f"Found {len(funds)} funds")
-
-        # Combine both types of items into a single response
-        response = {
-            "list_id": list_id,
-            "list_name": saved_list.name,
-            "list_type": saved_list.list_type,
-            "total_items": len(investors) + len(funds),
-            "items": {
-                "investors": {
-                    "count": len(investors),
-                    "data": investors
-                },
-                "funds": {
-                    "count": len(funds),
-                    "data": funds
-                }
-            }
-        }
-
+        response = await load_list_items(db, list_id)
         logger.info(f"Successfully retrieved {response['total_items']} items from list")
-        return response
+        return FastJSONResponse(response)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving list items: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -155,54 +155,37 @@ async def get_list_items_combined(
 @router.get("/{list_id}/items/by-type", response_model=None)
 async def get_list_items_by_type(
         list_id: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get all items in a saved list based on list type"""
     try:
         logger.info(f"Attempting to retrieve items for list {list_id}")
 
-        # Get the list with relationships loaded
-        saved_list = db.query(models.SavedList) \
-            .options(joinedload(models.SavedList.saved_investors)) \
-            .options(joinedload(models.SavedList.saved_funds)) \
-            .filter(models.SavedList.id == list_id) \
-            .first()
-
+        saved_list = await db.get(models.SavedList, list_id)
         if not saved_list:
             logger.error(f"List with id {list_id} not found")
             raise HTTPException(status_code=404, detail="List not found")
 
         logger.info(f"Found list: {saved_list.name} (type: {saved_list.list_type})")
 
-        # Convert items to dictionaries based on list type
         if saved_list.list_type.lower() == 'investor':
-            # Get the actual investor records
-            investor_ids = [inv.id for inv in saved_list.saved_investors]
-            investors = db.query(models.Investor) \
-                .filter(models.Investor.id.in_(investor_ids)) \
-                .all()
-
-            items = [crud.investor.to_dict(inv) for inv in investors]
+            items = await get_list_members(db, list_id, models.Investor, models.saved_investors_association.c.investor_id)
             logger.info(f"Retrieved {len(items)} investors")
         else:
-            # Get the actual fund records
-            fund_ids = [fund.id for fund in saved_list.saved_funds]
-            funds = db.query(models.InvestmentFund) \
-                .filter(models.InvestmentFund.id.in_(fund_ids)) \
-                .all()
-
-            items = [crud.investment_fund.to_dict(fund) for fund in funds]
+            items = await get_list_members(db, list_id, models.InvestmentFund, models.saved_funds_association.c.fund_id)
             logger.info(f"Retrieved {len(items)} funds")
 
         # Return formatted response
-        return {
+        return FastJSONResponse({
             "list_id": list_id,
             "list_name": saved_list.name,
             "list_type": saved_list.list_type,
             "total_items": len(items),
             "items": items
-        }
+        })
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving list items: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -215,17 +198,17 @@ async def get_list_items_by_type(
 async def update_list_type(
         list_id: int,
         list_type: str,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """Update the type of a saved list"""
     try:
-        saved_list = db.query(models.SavedList).filter(models.SavedList.id == list_id).first()
+        saved_list = await db.get(models.SavedList, list_id)
         if not saved_list:
             raise HTTPException(status_code=404, detail="List not found")
 
         # Update list type
         saved_list.list_type = list_type
-        db.commit()
+        await db.commit()
 
         return {
             "message": "List type updated successfully",
@@ -240,12 +223,12 @@ async def update_list_type(
 @router.post("/export/{list_id}")
 async def export_list(
         list_id: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """Export all items from a specific list"""
     try:
         # Get the list and its items
-        items_response = await get_list_items_combined(list_id, db)
+        items_response = await load_list_items(db, list_id)
 
         # Process investors
         investor_data = items_response["items"]["investors"]["data"]
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends, HTTPException
+from typing import Dict
+from auth import get_current_user
+from services.user_tier_service import get_user_tier
+from database import replica_set
+import models
+import pagination
+import pool_metrics
+import response_cache
+import search
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+def require_admin(current_user: models.User = Depends(get_current_user)) -> models.User:
+    """Restrict an endpoint to admin-tier users"""
+    if get_user_tier(current_user) != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+
+@router.get("/search")
+def get_search_metrics(_: models.User = Depends(require_admin)) -> Dict:
+    """Hit, miss and eviction counters of the caches behind the search endpoints"""
+    return {
+        "response_cache": response_cache.search_response_cache.stats(),
+        "statement_cache": search.statement_cache.stats(),
+        "count_cache": pagination.count_cache.stats(),
+    }
+
+
+@router.get("/pool")
+def get_pool_metrics(_: models.User = Depends(require_admin)) -> Dict:
+    """Connection pool occupancy, checkout wait and hold time histograms and timeouts
+    of the sync and async engines, for sizing DB_POOL_SIZE / DB_MAX_OVERFLOW"""
+    return pool_metrics.stats()
+
+
+@router.get("/replicas")
+def get_replica_metrics(_: models.User = Depends(require_admin)) -> Dict:
+    """Read replica health and failover state"""
+    return replica_set.stats()
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import Dict
 import models
+import row_counts
 from database import get_db
 import logging
 
@@ -13,8 +14,8 @@ logger = logging.getLogger(__name__)
 def get_database_stats(db: Session = Depends(get_db)) -> Dict:
     """Get database statistics"""
     try:
-        total_investors = db.query(models.Investor).count()
-        total_funds = db.query(models.InvestmentFund).count()
+        total_investors = row_counts.get(db, models.Investor)
+        total_funds = row_counts.get(db, models.InvestmentFund)
         return {
             "total_investors": total_investors,
             "total_investment_funds": total_funds
@@ -35,11 +36,11 @@ def test_pagination(
         skip = (page - 1) * per_page
 
         # Get Investors
-        total_investors = db.query(models.Investor).count()
+        total_investors = row_counts.get(db, models.Investor)
         investors = db.query(models.Investor).offset(skip).limit(per_page).all()
 
         # Get Investment Funds
-        total_funds = db.query(models.InvestmentFund).count()
+        total_funds = row_counts.get(db, models.InvestmentFund)
         funds = db.query(models.InvestmentFund).offset(skip).limit(per_page).all()
 
         return {
@@ -13,18 +13,23 @@ from api.v1.endpoints import (
     investor_filters,
     fund_filters,
     auth,
-    google_auth
+    google_auth,
+    metrics
 )
-from database import engine, test_db_connection
+from database import engine, dispose_engines, test_db_connection, create_extensions
 import models
+import cache
 import os
 import logging
 import sys
 from middleware.user_token_rate_limit import UserTokenRateLimitMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from middleware.auth_rate_limit import AuthRateLimitMiddleware
+from middleware.read_after_write import ReadAfterWriteMiddleware
 from starlette.middleware.httpsredirect import HTTPSRedirectMiddleware
 from auth import get_current_user
+from services.search_index import search_index
+from responses import FastJSONResponse
 
 
 # Configure logging
@@ -62,13 +67,21 @@ async def lifespan(_: FastAPI):
         logger.error("Database connection failed!")
         sys.exit(1)
 
+    create_extensions(engine)
     models.Base.metadata.create_all(bind=engine)
     logger.info("Database tables verified")
 
+    # Writes from other workers and the importer invalidate this worker's caches
+    cache.start_change_listener()
+
+    if search_index.enabled:
+        search_index.load_all()
+
     yield
 
     # Shutdown
     logger.info("Shutting down application...")
+    await dispose_engines()
 
 
 # Create FastAPI app
@@ -76,13 +89,16 @@ app = FastAPI(
     title="Investor Database API",
     description="API for managing investors and investment funds database",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 if os.getenv("ENVIRONMENT") == "production":
     app.add_middleware(HTTPSRedirectMiddleware)
 
 app.add_middleware(AuthRateLimitMiddleware)
 
+app.add_middleware(ReadAfterWriteMiddleware)
+
 app.add_middleware(
     SessionMiddleware,
     secret_key=os.getenv("SECRET_KEY", "4GGdb2Ol15zbAeGzQQdwxH9WdW8HPCjV"),
@@ -136,7 +152,8 @@ protected_routes = [
     (lists.router, "/api/v1/lists", "lists", "basic"),
     (investor_filters.router, "/api/v1/filters", "Investor Filters", "basic"),
     (fund_filters.router, "/api/v1/filters", "Fund Filters", "basic"),
-    (google_auth.router, "/api/v1/auth/google", "google authentication", "basic")
+    (google_auth.router, "/api/v1/auth/google", "google authentication", "basic"),
+    (metrics.router, "/api/v1/metrics", "metrics", "basic")
 ]
 
 for router, prefix, tag, _ in protected_routes:
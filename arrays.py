@@ -0,0 +1,63 @@
+import csv
+import json
+from typing import Any, List, Optional
+
+import pandas as pd
+
+# Canonical form of the text[] columns (industry_preferences, stage_preferences, ...):
+# a list of trimmed, non-empty, distinct strings in first-seen order, or NULL
+# instead of an empty list. Every write path stores values through normalize(),
+# so reads can return arrays as they come from the database.
+
+
+def _is_missing(value: Any) -> bool:
+    """None, NaN, pd.NA or pd.NaT, as CSV cells read by pandas can be. Only scalars
+    are tested: pd.isna of a list is elementwise"""
+    return pd.api.types.is_scalar(value) and pd.isna(value)
+
+
+def _split_text(value: str) -> List[str]:
+    """Items of one text value: a Postgres array literal '{a,"b, c"}', a JSON or
+    Python style list '["a", 'b']', or comma-separated 'a, b'. A plain value
+    without commas is a single item"""
+    text = value.strip()
+    if text.startswith('[') and text.endswith(']'):
+        try:
+            parsed = json.loads(text)
+            if isinstance(parsed, list):
+                return [item for entry in parsed for item in _split_item(entry)]
+        except ValueError:
+            pass
+        text = text[1:-1]
+    elif text.startswith('{') and text.endswith('}'):
+        text = text[1:-1]
+    # Double quotes protect commas inside an item, as in array literals
+    items = next(csv.reader([text], skipinitialspace=True), [])
+    return [item.strip().strip('\'"').strip() for item in items]
+
+
+def _split_item(item: Any) -> List[str]:
+    """Items of one list element. Legacy rows hold a whole array literal as a
+    single element; other elements are kept whole, commas included"""
+    if _is_missing(item):
+        return []
+    text = str(item).strip()
+    if text.startswith(('{', '[')):
+        return _split_text(text)
+    return [text]
+
+
+def normalize(value: Any) -> Optional[List[str]]:
+    """Canonical array column value for a list or tuple, or for a text form of
+    one as found in CSV imports (a single value without commas is one item)"""
+    if _is_missing(value):
+        return None
+    if isinstance(value, (list, tuple)):
+        candidates = [item for entry in value for item in _split_item(entry)]
+    else:
+        candidates = _split_text(str(value))
+    items = []
+    for item in candidates:
+        if item and item not in items:
+            items.append(item)
+    return items or None
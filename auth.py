@@ -9,10 +9,12 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 import models
-from database import get_db
+from database import AsyncSessionLocal
 import bcrypt
 import logging
 
@@ -97,7 +99,10 @@ def generate_token(length=32):
     return ''.join(secrets.choice(alphabet) for _ in range(length))
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    """The user of the bearer token, looked up in a session of its own that is
+    closed before the endpoint runs, so a request holds only its endpoint's
+    connection. The user is detached: endpoints that change it re-fetch it"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -109,10 +114,13 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
-    except JWTError:
+        # asyncpg does not cast text parameters to integer
+        user_id = int(user_id)
+    except (JWTError, ValueError):
         raise credentials_exception
 
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    async with AsyncSessionLocal() as db:
+        user = await db.get(models.User, user_id)
     if user is None:
         raise credentials_exception
     if not user.is_active:
@@ -125,9 +133,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     return user
 
 
-def create_refresh_token(user_id: int, db: Session) -> str:
+async def create_refresh_token(user_id: int, db: AsyncSession) -> str:
     expires_delta = timedelta(days=int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7")))
-    expires_at = datetime.now(UTC) + expires_delta
+    expires_at = models.utcnow() + expires_delta
 
     # Generate token
     token = secrets.token_urlsafe(64)
@@ -140,37 +148,39 @@ def create_refresh_token(user_id: int, db: Session) -> str:
     )
 
     db.add(refresh_token)
-    db.commit()
+    await db.commit()
 
     return token
 
 
-def verify_refresh_token(token: str, db: Session) -> Optional[models.User]:
-    # Get token from database
-    db_token = db.query(models.RefreshToken).filter(
-        models.RefreshToken.token == token,
-        models.RefreshToken.revoked == False,
-        models.RefreshToken.expires_at > datetime.now(UTC)
-    ).first()
-
-    if not db_token:
-        return None
-
-    return db_token.user
+async def verify_refresh_token(token: str, db: AsyncSession) -> Optional[models.User]:
+    # The user is joined in the same query; relationships cannot lazy load on an AsyncSession
+    user = await db.scalar(
+        select(models.User)
+        .join(models.RefreshToken, models.RefreshToken.user_id == models.User.id)
+        .where(
+            models.RefreshToken.token == token,
+            models.RefreshToken.revoked == False,
+            models.RefreshToken.expires_at > models.utcnow()
+        )
+    )
+    return user
 
 
-def revoke_refresh_token(token: str, db: Session) -> bool:
+async def revoke_refresh_token(token: str, db: AsyncSession) -> bool:
     """Revoke a refresh token (for logout)"""
-    db_token = db.query(models.RefreshToken).filter(
-        models.RefreshToken.token == token,
-        models.RefreshToken.revoked == False
-    ).first()
+    db_token = await db.scalar(
+        select(models.RefreshToken).where(
+            models.RefreshToken.token == token,
+            models.RefreshToken.revoked == False
+        )
+    )
 
     if not db_token:
         return False
 
     db_token.revoked = True
-    db.commit()
+    await db.commit()
     return True
 
 
@@ -0,0 +1,92 @@
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+# Range labels offered by the UI for capital managed, min/max investment and
+# number of investors, with inclusive (lower, upper) bounds. This is the only
+# definition of the labels: search filters, the in-memory index and the
+# generated *_bucket columns are all derived from it.
+RANGE_LABELS: Dict[str, Tuple[float, float]] = {
+    "$1B+": (1_000_000_000, float('inf')),
+    "$100M - $500M": (100_000_000, 500_000_000),
+    "$500M - $1B": (500_000_000, 1_000_000_000),
+    "$25M - $100M": (25_000_000, 100_000_000),
+    "$0 - $25M": (1, 25_000_000),
+    "$10M - $25M": (10_000_000, 25_000_000),
+    "$100M+": (100_000_000, float('inf')),
+    "$1M - $10M": (1_000_000, 10_000_000),
+    "$0 - $1M": (1, 1_000_000),
+    "$5M - $20M": (5_000_000, 20_000_000),
+    "$20M+": (20_000_000, float('inf')),
+    "$1M - $5M": (1_000_000, 5_000_000),
+    "$250K - $1M": (250_000, 1_000_000),
+    "$0 - $250K": (0, 250_000),
+    "1 - 10": (1, 9.99),
+    "10 - 20": (10, 19.99),
+    "20 - 30": (20, 29.99),
+    "30 - 40": (30, 40),
+}
+
+# Numeric columns that get a generated <column>_bucket smallint
+BUCKETED_COLUMNS = ["capital_managed", "min_investment", "max_investment", "number_of_investors"]
+
+# Labels overlap and share endpoints, so values are bucketed into the disjoint
+# pieces cut by every finite bound: bucket 2i is the open interval below
+# BOUNDARIES[i] (above the previous boundary), bucket 2i + 1 is BOUNDARIES[i]
+# itself, and the last bucket is everything above the largest boundary. Every
+# label is then exactly a set of buckets. Changing RANGE_LABELS renumbers the
+# buckets, so it needs a migration that recreates the bucket columns.
+BOUNDARIES: List[float] = sorted({
+    float(bound) for bounds in RANGE_LABELS.values() for bound in bounds if bound != float('inf')
+})
+
+
+def bucket_column(column: str) -> str:
+    return f"{column}_bucket"
+
+
+def label_bounds(label: str) -> Tuple[float, float]:
+    """Inclusive bounds of a range label, raising ValueError for unknown labels"""
+    try:
+        return RANGE_LABELS[label]
+    except KeyError:
+        raise ValueError(f"Unknown range: {label}")
+
+
+def bucket_of(value: Optional[float]) -> Optional[int]:
+    """Bucket of a numeric value; None for NULL and NaN, matching bucket_sql"""
+    if value is None or value != value:
+        return None
+    i = bisect_left(BOUNDARIES, value)
+    if i < len(BOUNDARIES) and BOUNDARIES[i] == value:
+        return 2 * i + 1
+    return 2 * i
+
+
+def buckets_for_label(label: str) -> List[int]:
+    """Buckets that together cover exactly the values a label's range includes"""
+    lower, upper = label_bounds(label)
+    edges = [float('-inf')] + BOUNDARIES + [float('inf')]
+    buckets = []
+    for i, point in enumerate(BOUNDARIES):
+        if lower <= edges[i] and point <= upper:
+            buckets.append(2 * i)
+        if lower <= point <= upper:
+            buckets.append(2 * i + 1)
+    if lower <= BOUNDARIES[-1] and upper == float('inf'):
+        buckets.append(2 * len(BOUNDARIES))
+    return buckets
+
+
+def buckets_for_labels(labels: List[str]) -> List[int]:
+    """Union of the buckets of several labels, as used by a multi-select filter.
+    An unknown label raises ValueError, which the search endpoints answer with a 400"""
+    return sorted({bucket for label in labels for bucket in buckets_for_label(label)})
+
+
+def bucket_sql(column: str) -> str:
+    """SQL expression computing bucket_of(column), for the generated bucket columns"""
+    cases = [f"WHEN {column} IS NULL OR {column} = 'NaN' THEN NULL"]
+    for i, point in enumerate(BOUNDARIES):
+        cases.append(f"WHEN {column} < {point!r} THEN {2 * i}")
+        cases.append(f"WHEN {column} = {point!r} THEN {2 * i + 1}")
+    return f"CASE {' '.join(cases)} ELSE {2 * len(BOUNDARIES)} END"
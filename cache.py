@@ -0,0 +1,190 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+from sqlalchemy import text
+from database import engine
+import logging
+import select
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Caches that must forget entries when a table is written to
+_registered_caches: List["TTLCache"] = []
+
+# Other consumers of table writes, e.g. the in-memory search index
+_listeners: List[Callable[[Optional[str]], None]] = []
+
+# Postgres NOTIFY channel carrying table writes between processes (API workers,
+# the importer); payloads are "<origin>:<table>"
+CHANGE_CHANNEL = "table_changed"
+_ORIGIN = uuid.uuid4().hex
+
+
+class TTLCache:
+    """Thread-safe in-process cache with a per-entry TTL and a size bound.
+
+    Keys are tuples whose first element is the table the value was derived
+    from, so writes to that table can drop every dependent entry. Writes made
+    by other processes arrive through start_change_listener; the TTL bounds
+    staleness if that notification is lost"""
+
+    def __init__(self, name: str, ttl: float, maxsize: int = 1024):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        _registered_caches.append(self)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, table: Optional[str] = None) -> None:
+        """Drop all entries, or only those derived from ``table``"""
+        with self._lock:
+            if table is None:
+                self.invalidations += len(self._data)
+                self._data.clear()
+                return
+            for key in [k for k in self._data if k[0] == table]:
+                del self._data[key]
+                self.invalidations += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def register_listener(callback: Callable[[Optional[str]], None]) -> None:
+    """Call ``callback(table)`` after every committed write to ``table``, and
+    ``callback(None)`` when writes may have been missed and any table may have changed"""
+    _listeners.append(callback)
+
+
+def _notify_listeners(table: Optional[str]) -> None:
+    for listener in _listeners:
+        try:
+            listener(table)
+        except Exception as e:
+            logger.error(f"Error notifying listener of change to {table or 'all tables'}: {str(e)}")
+
+
+def invalidate_table(table: str) -> None:
+    """Drop this process's cached data derived from ``table``"""
+    for registered in _registered_caches:
+        registered.invalidate(table)
+    _notify_listeners(table)
+    logger.debug(f"Invalidated caches for table {table}")
+
+
+def invalidate_all() -> None:
+    """Drop this process's cached data derived from any table"""
+    for registered in _registered_caches:
+        registered.invalidate()
+    _notify_listeners(None)
+
+
+def announce_table_change(db, table: str) -> None:
+    """Queue the notification of a write to ``table`` in the transaction of ``db``
+    (a Session or Connection) making it. Postgres delivers it to the other processes
+    only if that transaction commits; call invalidate_table after the commit"""
+    db.execute(text("SELECT pg_notify(:channel, :payload)"),
+               {"channel": CHANGE_CHANNEL, "payload": f"{_ORIGIN}:{table}"})
+
+
+def notify_table_changed(table: str) -> None:
+    """Invalidate cached data derived from ``table`` here and in every process
+    running start_change_listener, for writers that have already committed
+    (e.g. the importer). Writes in a transaction use announce_table_change"""
+    invalidate_table(table)
+    try:
+        with engine.begin() as conn:
+            announce_table_change(conn, table)
+    except Exception as e:
+        logger.warning(f"Could not broadcast change to {table}: {str(e)}")
+
+
+def _listen_for_changes(poll_seconds: float) -> None:
+    reconnecting = False
+    while True:
+        connection = None
+        try:
+            connection = engine.raw_connection()
+            connection.detach()
+            dbapi_connection = connection.dbapi_connection
+            dbapi_connection.autocommit = True
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANGE_CHANNEL}")
+            logger.info(f"Listening for table changes on channel {CHANGE_CHANNEL}")
+            if reconnecting:
+                # Writes notified while disconnected were missed, and caches may
+                # have been refilled with older data since the failure
+                invalidate_all()
+                reconnecting = False
+
+            while True:
+                if select.select([dbapi_connection], [], [], poll_seconds) == ([], [], []):
+                    continue
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    origin, _, table = dbapi_connection.notifies.pop(0).payload.partition(':')
+                    if origin != _ORIGIN:
+                        invalidate_table(table)
+        except Exception as e:
+            logger.error(f"Table change listener failed, reconnecting: {str(e)}")
+            # Anything written while disconnected may have been missed
+            invalidate_all()
+            reconnecting = True
+            time.sleep(poll_seconds)
+        finally:
+            if connection is not None:
+                connection.close()
+
+
+def start_change_listener(poll_seconds: float = 5.0) -> None:
+    """Apply table writes notified by other processes to this process's caches"""
+    threading.Thread(
+        target=_listen_for_changes, args=(poll_seconds,), name="table-change-listener", daemon=True
+    ).start()
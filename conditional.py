@@ -0,0 +1,51 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import Request
+from typing import Dict
+
+# Conditional GET for single-row endpoints. The ETag is the row version, which
+# the bump_row_version trigger increments on every UPDATE, so clients that
+# re-poll a profile revalidate it with If-None-Match and get a bodiless 304.
+
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def validator_headers(version: int, updated_at: datetime) -> Dict[str, str]:
+    """ETag, Last-Modified and a Cache-Control asking clients to revalidate"""
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return {
+        "ETag": etag(version),
+        "Last-Modified": format_datetime(updated_at.astimezone(timezone.utc), usegmt=True),
+        "Cache-Control": "private, no-cache",
+    }
+
+
+def is_conditional(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def not_modified(request: Request, version: int, updated_at: datetime) -> bool:
+    """Whether the client's copy is current. If-None-Match takes precedence over
+    If-Modified-Since, which is only compared when no ETag was sent"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison: W/"3" matches "3"
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag(version) in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if updated_at.tzinfo is None:
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    # Last-Modified has whole-second precision
+    return updated_at.replace(microsecond=0) <= since
@@ -1,10 +1,16 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, String, Text
+from sqlalchemy import or_, any_, bindparam, delete, func, literal_column, select, update, ARRAY, Integer, String, Text
+from sqlalchemy.dialects.postgresql import insert
+from pydantic import ValidationError
+import arrays
 import models
 import schemas
-from typing import TypeVar, Generic, List, Any, Dict, Optional, Type
+import cache
+import serializers
+from typing import TypeVar, Generic, List, Any, Dict, Optional, Tuple, Type
 import logging
 import math
+import os
 from decimal import Decimal
 
 ModelType = TypeVar("ModelType", bound=models.Base)
@@ -12,8 +18,14 @@ CreateSchemaType = TypeVar("CreateSchemaType", bound=schemas.BaseModel)
 
 logger = logging.getLogger(__name__)
 
+# Rows per INSERT ... ON CONFLICT statement in bulk_upsert
+BULK_UPSERT_BATCH_SIZE = int(os.getenv("BULK_UPSERT_BATCH_SIZE", "1000"))
+
 
 class CRUDBase(Generic[ModelType, CreateSchemaType]):
+    # Column bulk_upsert matches on when keyed by email
+    email_column: Optional[str] = None
+
     def __init__(self, model: Type[ModelType]):
         self.model = model
 
@@ -25,19 +37,20 @@ class CRUDBase(Generic[ModelType, CreateSchemaType]):
             search: Optional[str] = None,
             filters: Optional[Dict] = None,
             sort_by: Optional[str] = None,
-            sort_desc: bool = False
+            sort_desc: bool = False,
+            fields: Optional[List[str]] = None
     ) -> List[Dict]:
         try:
-            query = db.query(self.model)
+            # Sparse fieldsets select only the requested columns instead of whole rows
+            fields = self.resolve_fields(fields)
+            if fields:
+                query = db.query(*[getattr(self.model, name) for name in fields])
+            else:
+                query = db.query(self.model)
 
             # Apply text search across string fields
             if search:
-                search_filters = []
-                for column in self.model.__table__.columns:
-                    if isinstance(column.type, (String, Text)):
-                        search_filters.append(getattr(self.model, column.key).ilike(f"%{search}%"))
-                if search_filters:
-                    query = query.filter(or_(*search_filters))
+                query = query.filter(self.text_search_condition(search))
 
             # Apply filters
             if filters:
@@ -60,20 +73,56 @@ class CRUDBase(Generic[ModelType, CreateSchemaType]):
                         else:
                             query = query.filter(getattr(self.model, key) == value)
 
-            # Apply sorting
+            # Apply sorting, with the primary key as tiebreaker so pages are stable
             if sort_by and hasattr(self.model, sort_by):
                 order_col = getattr(self.model, sort_by)
                 if sort_desc:
                     order_col = order_col.desc()
                 query = query.order_by(order_col)
+            query = query.order_by(self.model.id)
 
             records = query.offset(skip).limit(limit).all()
-            return [self.to_dict(record) for record in records]
+            return [self.to_dict(record, fields) for record in records]
 
         except Exception as e:
             logger.error(f"Error in get_multi: {str(e)}")
             raise
 
+    def text_columns(self) -> List[str]:
+        return [
+            column.key for column in self.model.__table__.columns
+            if isinstance(column.type, (String, Text)) and column.computed is None
+        ]
+
+    def text_search_condition(self, search: str):
+        """Rows where any text column matches ILIKE '%search%'.
+
+        Models with a search_text column (every text column joined, trigram
+        indexed) are searched through it with one indexed match. Terms with
+        ILIKE wildcards or escapes could match across the joined columns, so those still
+        test the columns one by one, as does a model whose search_text list is
+        out of date"""
+        pattern = f"%{search}%"
+        columns = self.text_columns()
+        indexed = getattr(self.model, "search_text_columns", None) == columns
+        if indexed and not any(c in search for c in models.ILIKE_SPECIAL_CHARACTERS + (models.SEARCH_TEXT_SEPARATOR,)):
+            return self.model.search_text.ilike(pattern)
+        return or_(*[getattr(self.model, column).ilike(pattern) for column in columns])
+
+    def resolve_fields(self, fields: Optional[List[str]]) -> Optional[List[str]]:
+        """Validate a sparse fieldset (repeated and/or comma-separated column names)
+        against the model's columns. The primary key is always included and names
+        come back in table order; None or empty means every column"""
+        if not fields:
+            return None
+        requested = {name.strip() for entry in fields for name in entry.split(',') if name.strip()}
+        columns = serializers.serializable_columns(self.model)
+        unknown = requested - set(columns)
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+        requested.add("id")
+        return [name for name in columns if name in requested]
+
     @staticmethod
     def sanitize_float(value: Any) -> Optional[float]:
         if value is None:
@@ -94,9 +143,15 @@ class CRUDBase(Generic[ModelType, CreateSchemaType]):
             return [value]
         return None
 
-    def to_dict(self, obj: ModelType) -> Dict:
+    def to_dict(self, obj: ModelType, fields: Optional[List[str]] = None) -> Dict:
+        """Serialize an instance, or a row of selected columns limited to ``fields``"""
         result = {}
-        for column in obj.__table__.columns:
+        for column in self.model.__table__.columns:
+            # Generated columns (search documents etc.) are internal to the database
+            if column.computed is not None:
+                continue
+            if fields is not None and column.name not in fields:
+                continue
             value = getattr(obj, column.name)
 
             if isinstance(value, (float, Decimal)):
@@ -104,25 +159,25 @@ class CRUDBase(Generic[ModelType, CreateSchemaType]):
                     result[column.name] = None
                 else:
                     result[column.name] = float(value)
-            elif isinstance(value, list):
-                if value and isinstance(value[0], str) and value[0].startswith('{'):
-                    cleaned = value[0].strip('{}').split(',')
-                    result[column.name] = [item.strip('"') for item in cleaned if item]
-                else:
-                    result[column.name] = value
             else:
                 result[column.name] = value
 
         return result
 
+    def returning(self):
+        """Columns written statements return, as serialized by to_dict"""
+        return [self.model.__table__.c[name] for name in serializers.serializable_columns(self.model)]
+
     def create(self, db: Session, obj_in: CreateSchemaType) -> Dict:
+        """INSERT ... RETURNING, one round trip"""
         try:
             obj_in_data = self.prepare_data_for_db(obj_in.model_dump())
-            db_obj = self.model(**obj_in_data)
-            db.add(db_obj)
+            stmt = insert(self.model.__table__).values(**obj_in_data).returning(*self.returning())
+            row = db.execute(stmt).mappings().one()
+            cache.announce_table_change(db, self.model.__tablename__)
             db.commit()
-            db.refresh(db_obj)
-            return self.to_dict(db_obj)
+            cache.invalidate_table(self.model.__tablename__)
+            return serializers.get_serializer(self.model)(row)
         except Exception as e:
             db.rollback()
             logger.error(f"Error creating {self.model.__name__}: {str(e)}")
@@ -138,38 +193,215 @@ class CRUDBase(Generic[ModelType, CreateSchemaType]):
             logger.error(f"Error in get: {str(e)}")
             raise
 
-    def update(self, db: Session, id: Any, obj_in: CreateSchemaType) -> Optional[Dict]:
-        try:
-            db_obj = db.query(self.model).filter(self.model.id == id).first()
-            if db_obj:
-                obj_data = self.prepare_data_for_db(obj_in.model_dump(exclude_unset=True))
-                for key, value in obj_data.items():
-                    setattr(db_obj, key, value)
+    def get_version(self, db: Session, id: Any):
+        """(version, updated_at) of a row, or None; answers conditional GETs without loading the row"""
+        return db.execute(
+            select(self.model.version, self.model.updated_at).where(self.model.id == id)
+        ).first()
 
-                db.commit()
-                db.refresh(db_obj)
-                return self.to_dict(db_obj)
-            return None
+    def get_many(self, db: Session, ids: List[int], fields: Optional[List[str]] = None) -> Tuple[List[Dict], List[int]]:
+        """Fetch rows by id with one ``id = ANY(:ids)`` query.
+
+        Returns the rows in request order (each id once) and the ids that were
+        not found. The ids are bound as a single array, so every batch size
+        shares one statement"""
+        ids = list(dict.fromkeys(ids))
+        serializer = serializers.get_serializer(self.model, self.resolve_fields(fields))
+        stmt = select(*[getattr(self.model, name) for name in serializer.fields]).where(
+            self.model.id == any_(bindparam("ids", type_=ARRAY(Integer)))
+        )
+        found = {row["id"]: serializer(row) for row in db.execute(stmt, {"ids": ids}).mappings()}
+        return [found[id] for id in ids if id in found], [id for id in ids if id not in found]
+
+    def update(self, db: Session, id: Any, obj_in: schemas.BaseModel) -> Optional[Dict]:
+        """UPDATE ... RETURNING of the fields set on ``obj_in``; None if the row does not exist"""
+        try:
+            obj_data = self.prepare_data_for_db(obj_in.model_dump(exclude_unset=True))
+            if not obj_data:
+                return self.get(db, id)
+            table = self.model.__table__
+            stmt = update(table).where(table.c.id == id).values(**obj_data).returning(*self.returning())
+            row = db.execute(stmt).mappings().first()
+            if row is None:
+                db.rollback()
+                return None
+            cache.announce_table_change(db, self.model.__tablename__)
+            db.commit()
+            cache.invalidate_table(self.model.__tablename__)
+            return serializers.get_serializer(self.model)(row)
         except Exception as e:
             db.rollback()
             logger.error(f"Error updating {self.model.__name__}: {str(e)}")
             raise
 
     def delete(self, db: Session, id: Any) -> Optional[Dict]:
+        """DELETE ... RETURNING; None if the row does not exist"""
         try:
-            obj = db.query(self.model).get(id)
-
-            if obj:
-                obj_dict = self.to_dict(obj)
-                db.delete(obj)
-                db.commit()
-                return obj_dict
-            return None
+            table = self.model.__table__
+            row = db.execute(delete(table).where(table.c.id == id).returning(*self.returning())).mappings().first()
+            if row is None:
+                db.rollback()
+                return None
+            cache.announce_table_change(db, self.model.__tablename__)
+            db.commit()
+            cache.invalidate_table(self.model.__tablename__)
+            return serializers.get_serializer(self.model)(row)
         except Exception as e:
             db.rollback()
             logger.error(f"Error deleting {self.model.__name__}: {str(e)}")
             raise
 
+    def bulk_upsert(
+            self,
+            db: Session,
+            records: List[Dict],
+            record_schema: Type[schemas.BaseModel],
+            key: schemas.BulkUpsertKey = schemas.BulkUpsertKey.EMAIL,
+            batch_size: int = BULK_UPSERT_BATCH_SIZE
+    ) -> Dict:
+        """Insert or update many records in a single transaction.
+
+        Records are validated one at a time, so a bad row is reported instead of
+        failing the request. external_id keys are upserted with INSERT ... ON
+        CONFLICT (external_id); emails are not unique in existing data, so they
+        are first resolved to the lowest matching id with one SELECT per batch
+        and then upserted ON CONFLICT (id). An existing row gets only the fields
+        its record sends; the others keep their values. If a key repeats, the last row wins.
+        An email-keyed row whose external_id belongs to another row is an error.
+        Each row gets a status: inserted, updated, superseded or error"""
+        key_column = "external_id" if key == schemas.BulkUpsertKey.EXTERNAL_ID else self.email_column
+        results: List[Optional[Dict]] = [None] * len(records)
+        pending: Dict[str, Tuple[int, Dict]] = {}
+
+        for index, record in enumerate(records):
+            try:
+                # Only the fields a row sends are written, so a partial row leaves the rest of an existing one
+                data = self.prepare_data_for_db(record_schema.model_validate(record).model_dump(exclude_unset=True))
+            except ValidationError as e:
+                errors = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+                results[index] = {"index": index, "status": "error", "error": errors}
+                continue
+            key_value = data.get(key_column)
+            if not key_value:
+                results[index] = {"index": index, "status": "error", "error": f"Missing {key_column}"}
+                continue
+            if key_value in pending:
+                superseded = pending[key_value][0]
+                results[superseded] = {"index": superseded, "status": "superseded"}
+            pending[key_value] = (index, data)
+
+        if key_column != "external_id":
+            self._reject_external_id_clashes(db, key_column, pending, results, batch_size)
+
+        items = list(pending.items())
+        try:
+            for start in range(0, len(items), batch_size):
+                batch = dict(items[start:start + batch_size])
+                for row in self._upsert_batch(db, key_column, batch, resolve_ids=key_column != "external_id"):
+                    index = batch[row.upsert_key][0]
+                    results[index] = {
+                        "index": index, "id": row.id, "status": "inserted" if row.inserted else "updated"
+                    }
+            if items:
+                cache.announce_table_change(db, self.model.__tablename__)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error bulk upserting {self.model.__name__}: {str(e)}")
+            raise
+
+        if items:
+            cache.invalidate_table(self.model.__tablename__)
+
+        statuses = [result["status"] for result in results]
+        return {
+            "total": len(records),
+            "inserted": statuses.count("inserted"),
+            "updated": statuses.count("updated"),
+            "superseded": statuses.count("superseded"),
+            "errors": statuses.count("error"),
+            "results": results,
+        }
+
+    def _reject_external_id_clashes(
+            self,
+            db: Session,
+            key_column: str,
+            pending: Dict[str, Tuple[int, Dict]],
+            results: List[Optional[Dict]],
+            batch_size: int
+    ) -> None:
+        """Email-keyed upserts conflict on id, so an external_id that is unique
+        elsewhere would fail the whole statement. Each external_id is kept for the
+        row whose email resolves to its current owner, or for the first row that
+        sends it if nobody owns it yet; the other rows are dropped and reported"""
+        senders: Dict[str, List[str]] = {}
+        for key_value, (_, data) in pending.items():
+            if data.get("external_id"):
+                senders.setdefault(data["external_id"], []).append(key_value)
+
+        key = getattr(self.model, key_column)
+        external_ids = list(senders)
+        for start in range(0, len(external_ids), batch_size):
+            chunk = external_ids[start:start + batch_size]
+            owners = dict(db.execute(
+                select(self.model.external_id, self.model.id).where(self.model.external_id.in_(chunk))
+            ).all())
+            targets = dict(db.execute(
+                select(key, func.min(self.model.id))
+                .where(key.in_([key_value for external_id in owners for key_value in senders[external_id]]))
+                .group_by(key)
+            ).all()) if owners else {}
+
+            for external_id in chunk:
+                owner_id = owners.get(external_id)
+                if owner_id is None:
+                    keeper = senders[external_id][0]
+                    error = f"external_id {external_id} is also sent for {keeper}"
+                else:
+                    keeper = next((k for k in senders[external_id] if targets.get(k) == owner_id), None)
+                    error = f"external_id {external_id} belongs to another {self.model.__name__} (id {owner_id})"
+                for key_value in senders[external_id]:
+                    if key_value != keeper:
+                        index = pending.pop(key_value)[0]
+                        results[index] = {"index": index, "status": "error", "error": error}
+
+    def _upsert_batch(self, db: Session, key_column: str, batch: Dict[str, Tuple[int, Dict]], resolve_ids: bool):
+        key = getattr(self.model, key_column)
+        if resolve_ids:
+            existing = dict(db.execute(
+                select(key, func.min(self.model.id)).where(key.in_(list(batch))).group_by(key)
+            ).all())
+            groups = [
+                ([dict(data, id=existing[k]) for k, (_, data) in batch.items() if k in existing], "id"),
+                ([data for k, (_, data) in batch.items() if k not in existing], None),
+            ]
+        else:
+            groups = [([data for _, data in batch.values()], key_column)]
+
+        for values, conflict_column in groups:
+            # A multi-row VALUES needs the same columns in every row, and the SET
+            # list may only name columns the rows sent
+            by_columns: Dict[Tuple[str, ...], List[Dict]] = {}
+            for data in values:
+                by_columns.setdefault(tuple(sorted(data)), []).append(data)
+
+            for columns, rows in by_columns.items():
+                stmt = insert(self.model).values(rows)
+                if conflict_column:
+                    updates = {column: stmt.excluded[column] for column in columns if column != "id"}
+                    if "external_id" in updates:
+                        # A null external_id does not clear the one a row has
+                        updates["external_id"] = func.coalesce(stmt.excluded.external_id, self.model.external_id)
+                    stmt = stmt.on_conflict_do_update(index_elements=[conflict_column], set_=updates)
+                # xmax is 0 only for freshly inserted row versions
+                stmt = stmt.returning(
+                    self.model.id,
+                    key.label("upsert_key"),
+                    literal_column(f"{self.model.__tablename__}.xmax = 0").label("inserted")
+                )
+                yield from db.execute(stmt)
+
     @staticmethod
     def handle_float(value: Any) -> Optional[float]:
         if value is None:
@@ -186,17 +418,21 @@ class CRUDBase(Generic[ModelType, CreateSchemaType]):
 
     def prepare_data_for_db(self, data: Dict[str, Any]) -> Dict[str, Any]:
         prepared_data = {}
+        columns = self.model.__table__.columns
         for key, value in data.items():
-            if isinstance(value, (float, Decimal)):
+            if key in columns and isinstance(columns[key].type, ARRAY):
+                # Lists, and single values such as a fund's financing_type
+                prepared_data[key] = arrays.normalize(value)
+            elif isinstance(value, (float, Decimal)):
                 prepared_data[key] = self.handle_float(value)
-            elif isinstance(value, list):
-                prepared_data[key] = [str(item) for item in value if item] or None
             else:
                 prepared_data[key] = value
         return prepared_data
 
 
 class CRUDInvestor(CRUDBase[models.Investor, schemas.InvestorCreate]):
+    email_column = "email"
+
     def get_by_email(self, db: Session, email: str) -> Optional[models.Investor]:
         return db.query(models.Investor).filter(models.Investor.email == email).first()
 
@@ -207,6 +443,8 @@ class CRUDInvestor(CRUDBase[models.Investor, schemas.InvestorCreate]):
 
 
 class CRUDInvestmentFund(CRUDBase[models.InvestmentFund, schemas.InvestmentFundCreate]):
+    email_column = "contact_email"
+
     def get_by_firm_email(self, db: Session, firm_email: str) -> Optional[models.InvestmentFund]:
         return db.query(models.InvestmentFund).filter(
             models.InvestmentFund.firm_email == firm_email
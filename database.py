@@ -1,10 +1,18 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, make_url, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session, declarative_base
+import asyncio
 import os
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import logging
 import traceback
-from fastapi import HTTPException
+import uuid
+import pool_metrics
+import replicas
+from replicas import Replica, ReplicaSet
+from fastapi import HTTPException, Request
 
 # Load environment variables
 load_dotenv()
@@ -20,12 +28,22 @@ SQLALCHEMY_DATABASE_URL = os.getenv(
 )
 
 # Create engine with proper configuration
+# Connection pool settings, shared by the sync and async engines (each has its own pool).
+# Sync endpoints run on Starlette's 40-thread pool, so pool_size + max_overflow below
+# 40 makes threads queue on checkout; GET /api/v1/metrics/pool shows how long.
+POOL_SETTINGS = dict(
+    pool_size=int(os.getenv("DB_POOL_SIZE", "5")),  # Connections kept open
+    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),  # Extra connections opened under load
+    pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),  # Seconds to wait for a connection
+    pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "-1")),  # Reconnect after this many seconds; -1 never
+    pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",  # Test connections on checkout
+)
+
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    pool_pre_ping=True,  # Enable connection health checks
-    pool_size=5,  # Maximum number of database connections in the pool
-    max_overflow=10  # Maximum number of connections that can be created beyond pool_size
+    **POOL_SETTINGS
 )
+pool_metrics.instrument(engine, "sync", POOL_SETTINGS["max_overflow"])
 
 # Create SessionLocal class with proper configuration
 SessionLocal = sessionmaker(
@@ -35,10 +53,124 @@ SessionLocal = sessionmaker(
     expire_on_commit=False
 )
 
+
+def async_database_url(url: str) -> str:
+    """The same database through the asyncpg driver"""
+    return make_url(url).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+
+# Async engine for async def endpoints: queries await asyncpg instead of blocking
+# the event loop. ASYNC_DATABASE_URL overrides the derived URL, e.g. when
+# DATABASE_URL carries psycopg2-only query options such as sslmode.
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", async_database_url(SQLALCHEMY_DATABASE_URL))
+
+# Server-side prepared statements on the asyncpg engines. asyncpg runs every query
+# as a prepared statement; what varies is whether a connection keeps it:
+#   cache      keep up to DB_STATEMENT_CACHE_SIZE statements per connection, so a
+#              repeated query skips parsing and, once Postgres switches to a generic
+#              plan (after five executions), planning. For direct connections, PgBouncer
+#              in session mode, and PgBouncer >= 1.21 with max_prepared_statements set
+#   pgbouncer  PgBouncer in transaction mode without max_prepared_statements: a
+#              statement is used only in the transaction that prepared it, under a
+#              unique name, so clients sharing a server connection never collide
+#   off        prepare every query afresh (the baseline of scripts/bench_prepared_statements)
+# The psycopg2 engines do not prepare statements.
+PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "cache").lower()
+STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+# Optional plan_cache_mode for asyncpg connections, e.g. force_generic_plan to stop
+# re-planning cached statements from the first execution. Sent as a startup
+# parameter, which PgBouncer only accepts when listed in ignore_startup_parameters
+PLAN_CACHE_MODE = os.getenv("DB_PLAN_CACHE_MODE")
+
+if PREPARED_STATEMENTS not in ("cache", "pgbouncer", "off"):
+    raise ValueError(f"DB_PREPARED_STATEMENTS must be cache, pgbouncer or off, not {PREPARED_STATEMENTS!r}")
+
+
+def asyncpg_connect_args(mode: str = PREPARED_STATEMENTS, **extra) -> dict:
+    """connect_args implementing DB_PREPARED_STATEMENTS for an asyncpg engine"""
+    args = dict(extra)
+    if mode == "cache":
+        args["prepared_statement_cache_size"] = STATEMENT_CACHE_SIZE
+    else:
+        args["prepared_statement_cache_size"] = 0
+    if mode == "pgbouncer":
+        args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4().hex}__"
+        # asyncpg's own cache, used outside SQLAlchemy's prepare(), would keep statements too
+        args["statement_cache_size"] = 0
+    if PLAN_CACHE_MODE:
+        args["server_settings"] = {"plan_cache_mode": PLAN_CACHE_MODE}
+    return args
+
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args=asyncpg_connect_args(),
+    **POOL_SETTINGS
+)
+pool_metrics.instrument(async_engine.sync_engine, "async", POOL_SETTINGS["max_overflow"])
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+# Optional read replicas (streaming standbys of DATABASE_URL), comma-separated.
+# Read-only endpoints depend on get_read_db / get_async_read_db instead of
+# get_db / get_async_db; with no replicas configured those are the same thing
+REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Seconds before retrying a replica that refused a connection
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+# Lifetime of the read-after cookie set on write responses; beyond it a client's
+# reads go to any replica again, however far behind
+READ_AFTER_SECONDS = int(os.getenv("READ_AFTER_SECONDS", "60"))
+# Fail over quickly instead of waiting on an unreachable replica's TCP timeout
+REPLICA_CONNECT_TIMEOUT = int(os.getenv("REPLICA_CONNECT_TIMEOUT", "3"))
+# psycopg2 failures arrive wrapped in DBAPIError; asyncpg raises OSError or a timeout from connect
+REPLICA_CONNECT_ERRORS = (DBAPIError, OSError, asyncio.TimeoutError)
+
+
+def create_replica(number: int, url: str) -> Replica:
+    name = f"replica{number}"
+    replica_engine = create_engine(
+        url,
+        connect_args={"connect_timeout": REPLICA_CONNECT_TIMEOUT},
+        **POOL_SETTINGS
+    )
+    pool_metrics.instrument(replica_engine, name, POOL_SETTINGS["max_overflow"])
+    replica_async_engine = create_async_engine(
+        async_database_url(url),
+        connect_args=asyncpg_connect_args(timeout=REPLICA_CONNECT_TIMEOUT),
+        **POOL_SETTINGS
+    )
+    pool_metrics.instrument(replica_async_engine.sync_engine, f"{name}-async", POOL_SETTINGS["max_overflow"])
+    return Replica(name, replica_engine, replica_async_engine)
+
+
+replica_set = ReplicaSet(
+    [create_replica(number, url) for number, url in enumerate(REPLICA_URLS, start=1)],
+    retry_seconds=REPLICA_RETRY_SECONDS
+)
+
+REPLAY_LSN = text("SELECT pg_last_wal_replay_lsn()::text")
+
+
 # Create Base class for declarative models
 Base = declarative_base()
 
 
+# Postgres extensions the models rely on (trigram indexes for autocomplete)
+REQUIRED_EXTENSIONS = ["pg_trgm"]
+
+
+def create_extensions(bind=engine):
+    """Install required extensions; must run before Base.metadata.create_all"""
+    with bind.begin() as conn:
+        for extension in REQUIRED_EXTENSIONS:
+            conn.execute(text(f"CREATE EXTENSION IF NOT EXISTS {extension}"))
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -47,6 +179,96 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """Session dependency for async def endpoints. Lazy loads are not possible on
+    an AsyncSession; sync-only helpers run through ``await db.run_sync(fn)``"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def read_session(request: Request = None) -> Session:
+    """Session for a read-only request: the next healthy replica, or the primary.
+
+    A replica that cannot hand out a connection is marked down and the next
+    one is tried. When the request carries a read-after marker, a replica that
+    has not replayed up to it is passed over. The primary is the last resort.
+    The caller closes the session"""
+    lsn = replicas.read_after(request)
+    for replica in replica_set.candidates(request):
+        db = SessionLocal(bind=replica.engine, info={"replica": replica.name, "read_after": lsn})
+        try:
+            if lsn is not None and not replica.caught_up(lsn):
+                replica.note_replayed(db.execute(REPLAY_LSN).scalar())
+                if not replica.caught_up(lsn):
+                    db.close()
+                    continue
+            else:
+                db.connection()
+            return db
+        except REPLICA_CONNECT_ERRORS as e:
+            db.close()
+            replica_set.mark_down(replica, e)
+    return SessionLocal(info={"read_after": lsn})
+
+
+def get_read_db(request: Request):
+    """get_db for endpoints that only read. Must not be used where the
+    request writes, or reads what it has just written"""
+    db = read_session(request)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@asynccontextmanager
+async def async_read_session(request: Request = None):
+    """AsyncSession for a read-only request, routed like read_session. For
+    endpoints that can often answer without the database (e.g. from the response
+    cache) and open it only when they cannot"""
+    lsn = replicas.read_after(request)
+    for replica in replica_set.candidates(request):
+        db = AsyncSessionLocal(bind=replica.async_engine, info={"replica": replica.name, "read_after": lsn})
+        try:
+            if lsn is not None and not replica.caught_up(lsn):
+                replica.note_replayed((await db.execute(REPLAY_LSN)).scalar())
+                if not replica.caught_up(lsn):
+                    await db.close()
+                    continue
+            else:
+                await db.connection()
+        except REPLICA_CONNECT_ERRORS as e:
+            await db.close()
+            replica_set.mark_down(replica, e)
+            continue
+        async with db:
+            yield db
+        return
+    async with AsyncSessionLocal(info={"read_after": lsn}) as db:
+        yield db
+
+
+async def get_async_read_db(request: Request):
+    """get_async_db for endpoints that only read, routed like get_read_db"""
+    async with async_read_session(request) as db:
+        yield db
+
+
+async def primary_wal_lsn() -> str:
+    """The primary's current WAL position, which covers every write committed so far"""
+    async with async_engine.connect() as conn:
+        return await conn.scalar(text("SELECT pg_current_wal_lsn()::text"))
+
+
+async def dispose_engines() -> None:
+    """Close every pooled connection of the primary and replica engines"""
+    engine.dispose()
+    await async_engine.dispose()
+    for replica in replica_set.replicas:
+        replica.engine.dispose()
+        await replica.async_engine.dispose()
+
+
 def test_db_connection():
     """Test database connection"""
     try:
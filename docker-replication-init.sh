@@ -0,0 +1,7 @@
+#!/bin/bash
+set -e
+
+# Runs once, when the primary's data directory is first initialized: allow the
+# db-replica service (docker compose --profile replica up) to stream WAL from it.
+# An existing postgres_data volume needs this line added to pg_hba.conf by hand.
+echo "host replication ${POSTGRES_USER} all scram-sha-256" >> "$PGDATA/pg_hba.conf"
@@ -0,0 +1,35 @@
+from fastapi import Request
+from starlette.middleware.base import BaseHTTPMiddleware
+import logging
+from database import READ_AFTER_SECONDS, primary_wal_lsn, replica_set
+from replicas import READ_AFTER_COOKIE, READ_AFTER_HEADER
+
+logger = logging.getLogger(__name__)
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+class ReadAfterWriteMiddleware(BaseHTTPMiddleware):
+    """Stamps successful writes with the primary's WAL position.
+
+    The position goes out as an X-Read-After-LSN header, for API clients to
+    send back on their next reads, and as a cookie for browsers. Reads carrying
+    it are served only by replicas that have replayed that far, so a client
+    sees its own writes whichever instance took them, while everyone else keeps
+    reading from replicas. Does nothing when no replicas are configured"""
+
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        if not replica_set.replicas or request.method not in WRITE_METHODS or response.status_code >= 400:
+            return response
+
+        try:
+            lsn = await primary_wal_lsn()
+        except Exception as e:
+            # Without the marker the client's next reads may lag; the write itself succeeded
+            logger.error(f"Error reading the primary WAL position: {str(e)}")
+            return response
+
+        response.headers[READ_AFTER_HEADER] = lsn
+        response.set_cookie(READ_AFTER_COOKIE, lsn, max_age=READ_AFTER_SECONDS, httponly=True, samesite="lax")
+        return response
@@ -1,9 +1,95 @@
-from sqlalchemy import Float, Text, Column, Integer, String, ForeignKey, Table, DateTime, Boolean
-from sqlalchemy.dialects.postgresql import ARRAY as PG_ARRAY
-from sqlalchemy.orm import relationship
+from sqlalchemy import BigInteger, Float, Text, Column, Integer, SmallInteger, String, ForeignKey, Table, DateTime, Boolean, Computed, Index, DDL, event, func, text
+from sqlalchemy.dialects.postgresql import ARRAY as PG_ARRAY, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from database import Base
+from buckets import bucket_sql
 from datetime import datetime, UTC
 
+# Weighted full-text search documents, kept current by Postgres as generated columns.
+# Emails are split on '@' and '.' so that "acme" matches "john@acme.com".
+INVESTOR_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(firm_name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(first_name, '') || ' ' || coalesce(last_name, '')), 'B')"
+)
+
+FUND_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(firm_name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(full_name, '')), 'B') || "
+    "setweight(to_tsvector('simple', translate(coalesce(contact_email, '') || ' ' || "
+    "coalesce(firm_email, ''), '@.', '  ')), 'C')"
+)
+
+# Contact name of an investor row, used for typo-tolerant autocomplete
+INVESTOR_FULL_NAME = "btrim(coalesce(first_name, '') || ' ' || coalesce(last_name, ''))"
+
+# Text columns searched by CRUDBase.get_multi; must list every String column of the model
+INVESTOR_SEARCH_TEXT_COLUMNS = [
+    "prefix", "first_name", "last_name", "gender", "contact_title", "email", "phone", "address",
+    "office_website", "firm_name", "city", "state", "country", "type_of_firm", "external_id",
+]
+FUND_SEARCH_TEXT_COLUMNS = [
+    "full_name", "title", "contact_email", "contact_phone", "firm_name", "firm_email", "firm_phone",
+    "firm_website", "firm_address", "firm_city", "firm_state", "firm_zip", "firm_country", "office_type",
+    "firm_type", "gender_ratio", "external_id",
+]
+
+# Joins search_text columns; a term containing it cannot be matched against search_text
+SEARCH_TEXT_SEPARATOR = "\x1f"
+
+# Characters with a meaning in an ILIKE pattern: the two wildcards and the escape character.
+# A term containing one is matched column by column in Postgres, never against search_text
+# or in memory, so every search path returns the same rows for it
+ILIKE_SPECIAL_CHARACTERS = ('%', '_', '\\')
+
+
+def search_text_sql(columns) -> str:
+    """All text columns of a row in one trigram-indexed value. A wildcard-free '%term%'
+    matches it exactly when it matches one of the columns, since no term spans a separator"""
+    return " || E'\\x1f' || ".join(f"coalesce({column}, '')" for column in columns)
+
+
+def utcnow() -> datetime:
+    """Current UTC time for the naive DateTime columns; asyncpg rejects aware values for them"""
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+# Bumps version and updated_at on every UPDATE of a row carrying version_columns()
+BUMP_ROW_VERSION_FUNCTION = (
+    "CREATE OR REPLACE FUNCTION bump_row_version() RETURNS trigger AS $$ "
+    "BEGIN NEW.version := OLD.version + 1; NEW.updated_at := now(); RETURN NEW; END "
+    "$$ LANGUAGE plpgsql"
+)
+
+
+def row_version_trigger(table: str) -> list:
+    return [
+        f"DROP TRIGGER IF EXISTS {table}_bump_row_version ON {table}",
+        f"CREATE TRIGGER {table}_bump_row_version BEFORE UPDATE ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION bump_row_version()",
+    ]
+
+
+def install_with_table(table: Table, statements: list) -> None:
+    """Run ``statements`` whenever create_all creates ``table``, so a recreated table
+    (scripts/reset_database) gets the triggers its migration installed on the old one"""
+    for statement in statements:
+        event.listen(table, "after_create", DDL(statement))
+
+
+def version_columns():
+    """Row version and modification time, bumped by the bump_row_version trigger on
+    every UPDATE (see scripts/migrate.py); the ETag and Last-Modified of a row"""
+    return (
+        Column(Integer, nullable=False, server_default=text("1")),
+        Column(DateTime(timezone=True), nullable=False, server_default=func.now()),
+    )
+
+
+def bucket_column(source: str):
+    """Indexed range bucket of a numeric column (see buckets.py), kept current by Postgres"""
+    return deferred(Column(SmallInteger, Computed(bucket_sql(source), persisted=True), index=True))
+
+
 # Association tables for many-to-many relationships
 saved_investors_association = Table(
     'saved_investors_association',
@@ -37,22 +123,23 @@ class SavedList(Base):
 
 class Investor(Base):
     __tablename__ = "investors"
+    search_text_columns = INVESTOR_SEARCH_TEXT_COLUMNS
 
     id = Column(Integer, primary_key=True, index=True)
     prefix = Column(String, nullable=True)
     first_name = Column(String)
     last_name = Column(String)
     gender = Column(String, nullable=True)
-    contact_title = Column(String, nullable=True)
+    contact_title = Column(String, nullable=True, index=True)
     email = Column(String, index=True)
     phone = Column(String, nullable=True)
     address = Column(String, nullable=True)
     office_website = Column(String, nullable=True)
     firm_name = Column(String, nullable=True)
-    city = Column(String, nullable=True)
-    state = Column(String, nullable=True)
-    country = Column(String, nullable=True)
-    type_of_firm = Column(String, nullable=True)
+    city = Column(String, nullable=True, index=True)
+    state = Column(String, nullable=True, index=True)
+    country = Column(String, nullable=True, index=True)
+    type_of_firm = Column(String, nullable=True, index=True)
     type_of_financing = Column(PG_ARRAY(String), nullable=True)
     industry_preferences = Column(PG_ARRAY(String), nullable=True)
     geographic_preferences = Column(PG_ARRAY(String), nullable=True)
@@ -61,10 +148,34 @@ class Investor(Base):
     min_investment = Column(Float, nullable=True)
     max_investment = Column(Float, nullable=True)
     number_of_investors = Column(Float, nullable=True)
+    external_id = Column(String, nullable=True, unique=True, index=True)
+    version, updated_at = version_columns()
+    full_name = deferred(Column(String, Computed(INVESTOR_FULL_NAME, persisted=True)))
+    search_vector = deferred(Column(TSVECTOR, Computed(INVESTOR_SEARCH_DOCUMENT, persisted=True)))
+    search_text = deferred(Column(Text, Computed(search_text_sql(INVESTOR_SEARCH_TEXT_COLUMNS), persisted=True)))
+    capital_managed_bucket = bucket_column("capital_managed")
+    min_investment_bucket = bucket_column("min_investment")
+    max_investment_bucket = bucket_column("max_investment")
+    number_of_investors_bucket = bucket_column("number_of_investors")
+
+    __table_args__ = (
+        Index('ix_investors_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('ix_investors_firm_name_trgm', 'firm_name',
+              postgresql_using='gin', postgresql_ops={'firm_name': 'gin_trgm_ops'}),
+        Index('ix_investors_full_name_trgm', 'full_name',
+              postgresql_using='gin', postgresql_ops={'full_name': 'gin_trgm_ops'}),
+        Index('ix_investors_search_text_trgm', 'search_text',
+              postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}),
+        Index('ix_investors_type_of_financing', 'type_of_financing', postgresql_using='gin'),
+        Index('ix_investors_industry_preferences', 'industry_preferences', postgresql_using='gin'),
+        Index('ix_investors_geographic_preferences', 'geographic_preferences', postgresql_using='gin'),
+        Index('ix_investors_stage_preferences', 'stage_preferences', postgresql_using='gin'),
+    )
 
 
 class InvestmentFund(Base):
     __tablename__ = "investment_funds"
+    search_text_columns = FUND_SEARCH_TEXT_COLUMNS
 
     id = Column(Integer, primary_key=True, index=True)
     full_name = Column(String)
@@ -76,10 +187,10 @@ class InvestmentFund(Base):
     firm_phone = Column(String, nullable=True)
     firm_website = Column(String, nullable=True)
     firm_address = Column(String, nullable=True)
-    firm_city = Column(String, nullable=True)
-    firm_state = Column(String, nullable=True)
+    firm_city = Column(String, nullable=True, index=True)
+    firm_state = Column(String, nullable=True, index=True)
     firm_zip = Column(String, nullable=True)
-    firm_country = Column(String, nullable=True)
+    firm_country = Column(String, nullable=True, index=True)
     office_type = Column(String, nullable=True)
     financing_type = Column(PG_ARRAY(String), nullable=True)
     industry_preferences = Column(PG_ARRAY(String), nullable=True)
@@ -88,9 +199,114 @@ class InvestmentFund(Base):
     capital_managed = Column(Float, nullable=True)
     min_investment = Column(Float, nullable=True)
     max_investment = Column(Float, nullable=True)
-    firm_type = Column(String, nullable=True)
+    firm_type = Column(String, nullable=True, index=True)
     number_of_investors = Column(Float, nullable=True)
-    gender_ratio = Column(String, nullable=True)
+    gender_ratio = Column(String, nullable=True, index=True)
+    external_id = Column(String, nullable=True, unique=True, index=True)
+    version, updated_at = version_columns()
+    search_vector = deferred(Column(TSVECTOR, Computed(FUND_SEARCH_DOCUMENT, persisted=True)))
+    search_text = deferred(Column(Text, Computed(search_text_sql(FUND_SEARCH_TEXT_COLUMNS), persisted=True)))
+    capital_managed_bucket = bucket_column("capital_managed")
+    min_investment_bucket = bucket_column("min_investment")
+    max_investment_bucket = bucket_column("max_investment")
+    number_of_investors_bucket = bucket_column("number_of_investors")
+
+    __table_args__ = (
+        Index('ix_investment_funds_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('ix_investment_funds_firm_name_trgm', 'firm_name',
+              postgresql_using='gin', postgresql_ops={'firm_name': 'gin_trgm_ops'}),
+        Index('ix_investment_funds_full_name_trgm', 'full_name',
+              postgresql_using='gin', postgresql_ops={'full_name': 'gin_trgm_ops'}),
+        Index('ix_investment_funds_search_text_trgm', 'search_text',
+              postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}),
+        Index('ix_investment_funds_financing_type', 'financing_type', postgresql_using='gin'),
+        Index('ix_investment_funds_industry_preferences', 'industry_preferences', postgresql_using='gin'),
+        Index('ix_investment_funds_geographic_preferences', 'geographic_preferences', postgresql_using='gin'),
+        Index('ix_investment_funds_stage_preferences', 'stage_preferences', postgresql_using='gin'),
+    )
+
+
+install_with_table(Investor.__table__, [BUMP_ROW_VERSION_FUNCTION] + row_version_trigger("investors"))
+install_with_table(InvestmentFund.__table__, [BUMP_ROW_VERSION_FUNCTION] + row_version_trigger("investment_funds"))
+
+
+class RowCount(Base):
+    """Row total of a large table as of its last reconcile, plus the deltas in
+    row_count_shards; kept current by the count_rows triggers below and corrected
+    by scripts/reconcile_row_counts"""
+    __tablename__ = "row_counts"
+
+    table_name = Column(String, primary_key=True)
+    row_count = Column(BigInteger, nullable=False)
+    reconciled_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class RowCountShard(Base):
+    """Rows a table gained or lost through the backends hashed to ``shard``"""
+    __tablename__ = "row_count_shards"
+
+    table_name = Column(String, primary_key=True)
+    shard = Column(SmallInteger, primary_key=True)
+    delta = Column(BigInteger, nullable=False)
+
+
+# Counter rows per table. A write transaction holds its shard's row lock until it
+# commits, so with a single counter every concurrent insert or delete on the table
+# queued behind it; now only writers whose backends share a shard do. A backend
+# always picks the same shard, so a transaction never holds two shards of one
+# table and shards cannot deadlock each other
+ROW_COUNT_SHARDS = 16
+
+# One counter update per statement, sized from its transition table, so a bulk
+# insert of 10,000 rows costs one upsert rather than 10,000
+COUNT_ROWS_FUNCTION = (
+    "CREATE OR REPLACE FUNCTION count_rows() RETURNS trigger AS $$ "
+    "DECLARE delta bigint; "
+    "BEGIN "
+    "IF TG_OP = 'INSERT' THEN SELECT count(*) INTO delta FROM new_rows; "
+    "ELSIF TG_OP = 'DELETE' THEN SELECT -count(*) INTO delta FROM old_rows; "
+    "ELSE "
+    "UPDATE row_counts SET row_count = 0 WHERE table_name = TG_TABLE_NAME; "
+    "DELETE FROM row_count_shards WHERE table_name = TG_TABLE_NAME; "
+    "RETURN NULL; "
+    "END IF; "
+    "IF delta <> 0 THEN "
+    "INSERT INTO row_count_shards AS s (table_name, shard, delta) "
+    f"VALUES (TG_TABLE_NAME, pg_backend_pid() % {ROW_COUNT_SHARDS}, delta) "
+    "ON CONFLICT (table_name, shard) DO UPDATE SET delta = s.delta + EXCLUDED.delta; "
+    "END IF; "
+    "RETURN NULL; END "
+    "$$ LANGUAGE plpgsql"
+)
+
+# Triggers that call count_rows(); scripts/reconcile_row_counts checks they are in place
+COUNT_ROWS_TRIGGERS = ("count_inserts", "count_deletes", "count_truncates")
+
+
+def count_rows_triggers(table: str) -> list:
+    return [
+        f"DROP TRIGGER IF EXISTS {table}_count_inserts ON {table}",
+        f"CREATE TRIGGER {table}_count_inserts AFTER INSERT ON {table} "
+        f"REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION count_rows()",
+        f"DROP TRIGGER IF EXISTS {table}_count_deletes ON {table}",
+        f"CREATE TRIGGER {table}_count_deletes AFTER DELETE ON {table} "
+        f"REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION count_rows()",
+        f"DROP TRIGGER IF EXISTS {table}_count_truncates ON {table}",
+        f"CREATE TRIGGER {table}_count_truncates AFTER TRUNCATE ON {table} "
+        f"FOR EACH STATEMENT EXECUTE FUNCTION count_rows()",
+    ]
+
+
+# A table create_all has just made is empty, so its counter starts at 0. The
+# counter tables have to exist first for that
+for _table in (Investor.__table__, InvestmentFund.__table__):
+    _table.add_is_dependent_on(RowCount.__table__)
+    _table.add_is_dependent_on(RowCountShard.__table__)
+    install_with_table(_table, [COUNT_ROWS_FUNCTION] + count_rows_triggers(_table.name) + [
+        f"INSERT INTO row_counts (table_name, row_count, reconciled_at) VALUES ('{_table.name}', 0, now()) "
+        f"ON CONFLICT (table_name) DO UPDATE SET row_count = 0, reconciled_at = EXCLUDED.reconciled_at",
+        f"DELETE FROM row_count_shards WHERE table_name = '{_table.name}'"
+    ])
 
 
 class User(Base):
@@ -103,7 +319,7 @@ class User(Base):
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
     is_verified = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.now(UTC))
+    created_at = Column(DateTime, default=utcnow)
     last_login = Column(DateTime, nullable=True)
     verification_token = Column(String, nullable=True)
     verification_id = Column(String, nullable=True)
@@ -124,7 +340,7 @@ class RefreshToken(Base):
     token = Column(String, unique=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     expires_at = Column(DateTime)
-    created_at = Column(DateTime, default=datetime.now(UTC))
+    created_at = Column(DateTime, default=utcnow)
     revoked = Column(Boolean, default=False)
 
     # Relationship
@@ -0,0 +1,118 @@
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from enum import Enum
+from cache import TTLCache
+import replicas
+import schemas
+import base64
+import json
+import os
+
+# (sort expression, descending). The last key of a sort must be unique, e.g. the primary key.
+SortKey = Tuple[Any, bool]
+
+# Exact totals per (table, filter signature), dropped whenever the table is written
+# to. Filled only from the primary, and bypassed by reads carrying a read-after marker
+count_cache = TTLCache(
+    "search_counts",
+    ttl=float(os.getenv("COUNT_CACHE_TTL_SECONDS", "300")),
+    maxsize=int(os.getenv("COUNT_CACHE_MAX_ENTRIES", "4096"))
+)
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode the sort key values of the last row on a page as an opaque token"""
+    raw = json.dumps(list(values), separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str, expected_length: int) -> List[Any]:
+    """Decode a cursor produced by encode_cursor, raising ValueError if it is malformed
+    or was issued for a different sort order"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != expected_length:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def keyset_condition(sort_keys: Sequence[SortKey], values: Sequence[Any]):
+    """Rows strictly after ``values`` in the given sort order"""
+    clauses = []
+    for i, (expr, descending) in enumerate(sort_keys):
+        ties = [sort_keys[j][0] == values[j] for j in range(i)]
+        after = expr < values[i] if descending else expr > values[i]
+        clauses.append(and_(*ties, after))
+    return or_(*clauses)
+
+
+def filter_signature(filters: Dict[str, Any]) -> Tuple:
+    """Normalize filter parameters into an order-independent, hashable signature"""
+    items = []
+    for key, value in filters.items():
+        if value is None or value == [] or value == '':
+            continue
+        if isinstance(value, Enum):
+            value = value.value
+        if isinstance(value, (list, tuple, set)):
+            value = tuple(sorted({v.value if isinstance(v, Enum) else v for v in value}, key=str))
+        items.append((key, value))
+    return tuple(sorted(items))
+
+
+def explain_row_estimate(db: Session, statement) -> int:
+    """Row estimate for a statement with bound values, from the planner; no rows are read"""
+    compiled = statement.compile(
+        dialect=db.get_bind().dialect,
+        compile_kwargs={"render_postcompile": True}
+    )
+    params = compiled.params
+    if compiled.positional:
+        # asyncpg takes $n parameters as a tuple
+        params = tuple(params[name] for name in compiled.positiontup)
+    plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def fetch_counted_page(
+        db: Session,
+        plan,
+        count_mode: schemas.CountMode,
+        signature: Tuple,
+        per_page: int,
+        skip: int = 0,
+        cursor: Optional[str] = None
+) -> Tuple[list, Optional[str], int]:
+    """A page of a search.SearchPlan and its total according to ``count_mode``.
+
+    An exact total for an offset page is read from the page statement itself
+    (count(*) OVER ()) rather than from a second count query. Keyset pages only
+    see rows after the cursor, so their total is still counted separately.
+    Unfiltered totals are read from row_counts. Returns (rows, next_cursor, total)"""
+    total = None
+    key = (plan.model.__tablename__, signature)
+    if not plan.filtered:
+        # Exact and O(1) from the trigger-maintained row_counts, whatever the count mode
+        total = plan.count(db)
+    elif count_mode == schemas.CountMode.ESTIMATED:
+        total = plan.estimate_count(db)
+    elif count_mode == schemas.CountMode.CACHED and not replicas.carries_read_after(db):
+        total = count_cache.get(key)
+    cache_total = count_mode == schemas.CountMode.CACHED and total is None and replicas.served_by_primary(db)
+
+    if total is None and not cursor:
+        rows, next_cursor, total = plan.fetch_page_with_total(db, per_page, skip=skip)
+    else:
+        if total is None:
+            total = plan.count(db)
+        rows, next_cursor = plan.fetch_page(db, per_page, skip=skip, cursor=cursor)
+
+    if cache_total:
+        count_cache.set(key, total)
+    return rows, next_cursor, total
@@ -0,0 +1,146 @@
+from sqlalchemy import event, exc
+from typing import Dict, List, Optional
+import threading
+import time
+
+# Upper bounds (milliseconds) of the wait and hold time histogram buckets
+BUCKET_BOUNDS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class Histogram:
+    """Cumulative millisecond histogram in the Prometheus style (count of values <= bound)"""
+
+    def __init__(self, bounds: List[float] = BUCKET_BOUNDS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.count += 1
+        self.sum += ms
+        self.max = max(self.max, ms)
+        for i, bound in enumerate(self.bounds):
+            if ms <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def snapshot(self) -> Dict:
+        buckets, running = {}, 0
+        for bound, count in zip([str(b) for b in self.bounds] + ["+Inf"], self.counts):
+            running += count
+            buckets[bound] = running
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum, 3),
+            "mean_ms": round(self.sum / self.count, 3) if self.count else None,
+            "max_ms": round(self.max, 3),
+            "buckets": buckets,
+        }
+
+
+class PoolMetrics:
+    """Counters for one engine's connection pool.
+
+    Checkout wait time (including waits that time out) is measured around the
+    engine's connect(), which sessions, engine.begin() and engine.connect() all
+    go through; it includes opening a connection when the pool grows and the
+    pre-ping. Connects, invalidations and how long connections stay checked out
+    come from pool events. Events are registered on the engine, so they follow
+    the new pool engine.dispose() creates"""
+
+    def __init__(self, name: str, max_overflow: Optional[int] = None):
+        self.name = name
+        self.engine = None
+        self.max_overflow = max_overflow
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.peak_checked_out = 0
+        self.wait = Histogram()
+        self.hold = Histogram()
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.wait.observe(seconds * 1000)
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+
+    def attach(self, engine) -> None:
+        self.engine = engine
+        connect = engine.connect
+
+        def timed_connect():
+            started = time.perf_counter()
+            try:
+                connection = connect()
+            except exc.TimeoutError:
+                self.record_wait(time.perf_counter() - started, timed_out=True)
+                raise
+            self.record_wait(time.perf_counter() - started)
+            return connection
+
+        engine.connect = timed_connect
+
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            with self._lock:
+                self.connects += 1
+
+        @event.listens_for(engine, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            connection_record.info["checked_out_at"] = time.perf_counter()
+            with self._lock:
+                self.peak_checked_out = max(self.peak_checked_out, self.engine.pool.checkedout())
+
+        @event.listens_for(engine, "checkin")
+        def on_checkin(dbapi_connection, connection_record):
+            started = connection_record.info.pop("checked_out_at", None)
+            if started is not None:
+                with self._lock:
+                    self.hold.observe((time.perf_counter() - started) * 1000)
+
+        @event.listens_for(engine, "invalidate")
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            with self._lock:
+                self.invalidations += 1
+
+    def stats(self) -> Dict:
+        pool = self.engine.pool
+        with self._lock:
+            return {
+                "pool_size": pool.size(),
+                "max_overflow": self.max_overflow,
+                "timeout_seconds": pool.timeout(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "peak_checked_out": self.peak_checked_out,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "checkout_wait": self.wait.snapshot(),
+                "checked_out_time": self.hold.snapshot(),
+            }
+
+
+registry: Dict[str, PoolMetrics] = {}
+
+
+def instrument(engine, name: str, max_overflow: Optional[int] = None) -> PoolMetrics:
+    """Start collecting metrics for a QueuePool engine (for an AsyncEngine, pass its
+    sync_engine); ``max_overflow`` is only reported"""
+    metrics = registry[name] = PoolMetrics(name, max_overflow)
+    metrics.attach(engine)
+    return metrics
+
+
+def stats() -> Dict:
+    return {name: metrics.stats() for name, metrics in registry.items()}
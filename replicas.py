@@ -0,0 +1,123 @@
+from typing import Dict, List, Optional
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Request header that sends a read to the primary regardless of replica state
+CONSISTENCY_HEADER = "x-read-consistency"
+
+# Read-your-writes marker: the primary's WAL position after a client's write.
+# Write responses carry it as a header and a cookie; a read carrying it is only
+# served by a replica that has replayed at least that far
+READ_AFTER_HEADER = "x-read-after-lsn"
+READ_AFTER_COOKIE = "read_after_lsn"
+
+
+def parse_lsn(value: Optional[str]) -> Optional[int]:
+    """A pg_lsn such as '16/B374D848' as an integer; None if missing or malformed"""
+    if not value:
+        return None
+    high, _, low = value.strip().partition("/")
+    try:
+        return (int(high, 16) << 32) | int(low, 16)
+    except ValueError:
+        return None
+
+
+def read_after(request) -> Optional[int]:
+    """The WAL position a request must see, from its header or cookie"""
+    if request is None:
+        return None
+    return parse_lsn(request.headers.get(READ_AFTER_HEADER) or request.cookies.get(READ_AFTER_COOKIE))
+
+
+def served_by_primary(db) -> bool:
+    """Whether a session reads from the primary. Only such reads may fill the shared
+    caches: a replica may not have replayed the write that last emptied them yet"""
+    return "replica" not in db.info
+
+
+def carries_read_after(db) -> bool:
+    """Whether a session serves a request with a read-after marker. Such reads skip
+    the shared caches, which another worker's write may not have emptied here yet"""
+    return db.info.get("read_after") is not None
+
+
+class Replica:
+    """One read replica: a sync and an async engine, how far it has replayed the
+    primary's WAL, and when it may be retried after a failure"""
+
+    def __init__(self, name: str, engine, async_engine):
+        self.name = name
+        self.engine = engine
+        self.async_engine = async_engine
+        self.down_until = 0.0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        # Last pg_last_wal_replay_lsn() seen; replay only moves forward, so a marker
+        # at or below it needs no new lookup
+        self.replayed_lsn = 0
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.down_until
+
+    def caught_up(self, lsn: int) -> bool:
+        return self.replayed_lsn >= lsn
+
+    def note_replayed(self, value: Optional[str]) -> None:
+        if value is None:
+            # Not in recovery (pointed at a primary, or promoted): it has every write
+            self.replayed_lsn = float("inf")
+        else:
+            self.replayed_lsn = max(self.replayed_lsn, parse_lsn(value) or 0)
+
+
+class ReplicaSet:
+    """Picks the replica for a read-only request.
+
+    Healthy replicas take turns (round-robin). A replica that fails to hand
+    out a connection is skipped for retry_seconds, after which the next
+    request tries it again. Reads go to the primary when there are no
+    healthy replicas or the client asks for it with ``X-Read-Consistency: strong``.
+    Reads carrying a read-after marker skip replicas that have not replayed
+    up to it (see database.read_session)"""
+
+    def __init__(self, replicas: List[Replica], retry_seconds: float = 30):
+        self.replicas = replicas
+        self.retry_seconds = retry_seconds
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+
+    def candidates(self, request=None) -> List[Replica]:
+        """Replicas to try in order; empty when the read belongs on the primary"""
+        if not self.replicas:
+            return []
+        if request is not None and request.headers.get(CONSISTENCY_HEADER, "").lower() == "strong":
+            return []
+        now = time.monotonic()
+        start = next(self._turn) % len(self.replicas)
+        rotated = self.replicas[start:] + self.replicas[:start]
+        return [replica for replica in rotated if replica.healthy(now)]
+
+    def mark_down(self, replica: Replica, error: Exception) -> None:
+        message = str(error).strip()
+        with self._lock:
+            replica.down_until = time.monotonic() + self.retry_seconds
+            replica.failures += 1
+            replica.last_error = message.splitlines()[0] if message else type(error).__name__
+        logger.warning(f"Read replica {replica.name} unavailable, retrying in {self.retry_seconds}s: {replica.last_error}")
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        return {
+            replica.name: {
+                "healthy": replica.healthy(now),
+                "retry_in_seconds": round(max(replica.down_until - now, 0), 3),
+                "failures": replica.failures,
+                "last_error": replica.last_error,
+            }
+            for replica in self.replicas
+        }
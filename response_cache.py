@@ -0,0 +1,40 @@
+from fastapi.responses import Response
+from typing import Any, Dict, Optional, Tuple
+from cache import TTLCache
+from responses import FastJSONResponse
+import pagination
+import replicas
+import os
+
+# Rendered search responses per (table, normalized request parameters). Bodies
+# are stored already encoded, so a hit skips the database and serialization.
+# Only responses read from the primary are stored, and requests carrying a
+# read-after marker bypass it (see replicas.py).
+search_response_cache = TTLCache(
+    "search_responses",
+    ttl=float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "60")),
+    maxsize=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024"))
+)
+
+
+def cache_key(model, params: Dict[str, Any]) -> Tuple:
+    """Key for a request; parameter order and list value order do not matter"""
+    return model.__tablename__, pagination.filter_signature(params)
+
+
+def get(key: Tuple, request=None) -> Optional[Response]:
+    if replicas.read_after(request) is not None:
+        return None
+    body = search_response_cache.get(key)
+    if body is None:
+        return None
+    return Response(content=body, media_type="application/json")
+
+
+def store(key: Tuple, content: Dict, cache: bool = True) -> Response:
+    """Render ``content`` once, cache the body unless ``cache`` is false and
+    return it as the response"""
+    response = FastJSONResponse(content)
+    if cache:
+        search_response_cache.set(key, response.body)
+    return response
@@ -0,0 +1,57 @@
+from decimal import Decimal
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from typing import Any, Iterator
+from database import read_session
+import serializers
+import orjson
+import os
+
+# Rows fetched per server-side cursor round trip and written per NDJSON chunk
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "1000"))
+
+
+def _default(value: Any) -> Any:
+    """Types orjson does not encode natively"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    """orjson-encoded JSON response; the app's default response class.
+
+    NaN and +/-inf floats are written as null, the same values that
+    CRUDBase.sanitize_float produces. Endpoints that build plain
+    dicts/lists can return FastJSONResponse(content) directly, so FastAPI
+    does not run jsonable_encoder over the payload first"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def ndjson_search_stream(plan, request=None, batch_size: int = STREAM_BATCH_SIZE) -> StreamingResponse:
+    """Stream every row matching a search.SearchPlan as newline-delimited JSON.
+
+    The generator opens its own session (on a read replica when one is
+    available for ``request``), because the request's session is closed once
+    the endpoint returns. It is a plain generator, so Starlette
+    pulls one chunk at a time and only fetches the next batch after the
+    previous one was sent; a slow client holds back the cursor instead of
+    buffering rows in memory"""
+    serializer = serializers.get_serializer(plan.model, plan.fields)
+
+    def generate() -> Iterator[bytes]:
+        with read_session(request) as db:
+            for rows in plan.stream(db, batch_size):
+                yield b"".join([dumps(serializer(row._mapping)) + b"\n" for row in rows])
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
@@ -0,0 +1,29 @@
+from sqlalchemy import BigInteger, cast, func, select
+from sqlalchemy.orm import Session
+import models
+
+# Tables whose totals the count_rows triggers keep in row_counts (installed with the
+# tables in models.py and by migrations 9 and 10)
+COUNTED_TABLES = ["investors", "investment_funds"]
+
+
+def shard_total(table_name: str):
+    """Scalar subquery summing the row_count_shards deltas of ``table_name``
+    (sum() of a bigint is numeric in Postgres, hence the cast)"""
+    return (
+        select(cast(func.coalesce(func.sum(models.RowCountShard.delta), 0), BigInteger))
+        .where(models.RowCountShard.table_name == table_name)
+        .scalar_subquery()
+    )
+
+
+def get(db: Session, model) -> int:
+    """Total rows of ``model``'s table from its row_counts row and shards, instead
+    of a count(*) that scans the table. Falls back to count(*) until migration 9 has run"""
+    count = db.execute(
+        select(models.RowCount.row_count + shard_total(model.__tablename__))
+        .where(models.RowCount.table_name == model.__tablename__)
+    ).scalar()
+    if count is None:
+        count = db.execute(select(func.count()).select_from(model.__table__)).scalar_one()
+    return count
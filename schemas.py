@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from pydantic import BaseModel, ConfigDict, Field, EmailStr
 from datetime import datetime
 
@@ -437,6 +437,21 @@ class InvestorGender(str, Enum):
     FEMALE = "Female"
 
 
+###########################################
+# Search Options
+###########################################
+
+class SearchMode(str, Enum):
+    CONTAINS = "contains"
+    FULLTEXT = "fulltext"
+
+
+class CountMode(str, Enum):
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+    CACHED = "cached"
+
+
 ###########################################
 # Filter Parameters Models
 ###########################################
@@ -548,6 +563,13 @@ class InvestorCreate(InvestorBase):
     pass
 
 
+class InvestorUpdate(InvestorBase):
+    """PATCH body: every field is optional and only the fields sent are written"""
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    email: Optional[str] = None
+
+
 class Investor(InvestorBase):
     id: int
 
@@ -585,6 +607,37 @@ class InvestmentFundCreate(InvestmentFundBase):
     pass
 
 
+class InvestmentFundUpdate(InvestmentFundBase):
+    """PATCH body: every field is optional and only the fields sent are written"""
+    full_name: Optional[str] = None
+    contact_email: Optional[str] = None
+    firm_name: Optional[str] = None
+
+
+class InvestorBulkRecord(InvestorCreate):
+    external_id: Optional[str] = None
+
+
+class InvestmentFundBulkRecord(InvestmentFundCreate):
+    external_id: Optional[str] = None
+
+
+class BulkUpsertKey(str, Enum):
+    EMAIL = "email"
+    EXTERNAL_ID = "external_id"
+
+
+class BulkUpsertRequest(BaseModel):
+    """Records are validated one by one so that a bad row is reported, not fatal"""
+    key: BulkUpsertKey = BulkUpsertKey.EMAIL
+    records: List[Dict[str, Any]] = Field(..., max_length=10000)
+
+
+class BatchFetchRequest(BaseModel):
+    ids: List[int] = Field(..., max_length=1000)
+    fields: Optional[List[str]] = None
+
+
 class InvestmentFund(InvestmentFundBase):
     id: int
     model_config = ConfigDict(
@@ -0,0 +1,82 @@
+"""Load test: do concurrent requests to async endpoints overlap, or queue behind each other?
+
+    python -m scripts.bench_async_concurrency --url http://localhost:8000 --token <jwt>
+    python -m scripts.bench_async_concurrency --url ... --token ... --concurrency 1 4 16 64 --requests 400
+
+Run the API with a single worker (uvicorn app:app --workers 1) and without
+IN_MEMORY_SEARCH, so that all requests share one event loop and searches
+reach the database. For each concurrency level, /investors/search
+is called with a different page per request (so the response cache does not
+answer) while /auth/me is polled alongside. With blocking database calls,
+throughput stays flat as concurrency grows and /auth/me latency tracks the
+slowest search. With the async session both should scale until the pool or
+the database saturates."""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(timings: list, fraction: float) -> float:
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, requests: int, per_page: int,
+                    first_page: int) -> None:
+    queue = asyncio.Queue()
+    for page in range(first_page, first_page + requests):
+        queue.put_nowait(page)
+    search_timings, probe_timings = [], []
+    done = asyncio.Event()
+
+    async def search_worker():
+        while not queue.empty():
+            page = queue.get_nowait()
+            started = time.perf_counter()
+            response = await client.get("/api/v1/investors/search",
+                                        params={"page": page, "per_page": per_page, "count_mode": "exact"})
+            response.raise_for_status()
+            search_timings.append(time.perf_counter() - started)
+
+    async def probe():
+        # A cheap request that should not wait for the searches
+        while not done.is_set():
+            started = time.perf_counter()
+            (await client.get("/api/v1/auth/me")).raise_for_status()
+            probe_timings.append(time.perf_counter() - started)
+            await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    probe_task = asyncio.create_task(probe())
+    await asyncio.gather(*[search_worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    done.set()
+    await probe_task
+
+    print(f"concurrency {concurrency:>3}: {requests / elapsed:8.1f} req/s   "
+          f"search p50 {statistics.median(search_timings) * 1000:7.1f} ms  "
+          f"p95 {percentile(search_timings, 0.95) * 1000:7.1f} ms   "
+          f"/auth/me p50 {statistics.median(probe_timings) * 1000:7.1f} ms  "
+          f"p95 {percentile(probe_timings, 0.95) * 1000:7.1f} ms")
+
+
+async def main(args) -> None:
+    headers = {"Authorization": f"Bearer {args.token}"}
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 1)
+    async with httpx.AsyncClient(base_url=args.url.rstrip('/'), headers=headers, timeout=60, limits=limits) as client:
+        for level, concurrency in enumerate(args.concurrency):
+            # Every level reads pages no earlier level has cached
+            await run_level(client, concurrency, args.requests, args.per_page, 1 + level * args.requests)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--token", required=True)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--requests", type=int, default=200, help="search requests per concurrency level")
+    parser.add_argument("--per-page", type=int, default=100)
+    asyncio.run(main(parser.parse_args()))
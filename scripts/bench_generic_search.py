@@ -0,0 +1,91 @@
+"""get_multi's generic ``search``: OR of ILIKE over every text column vs the trigram-indexed search_text.
+
+    python -m scripts.bench_generic_search               # 1M synthetic investors
+    python -m scripts.bench_generic_search --rows 200000 --keep
+
+Creates bench_investors (LIKE investors INCLUDING ALL, so it has the
+search_text column and its trigram index once migration 6 has run), fills it
+with generated rows and times count(*) and a first page for a few terms with
+both predicates. The two predicates must return the same rows; the script
+checks that the counts agree. The table is dropped afterwards unless --keep
+is given."""
+import argparse
+import time
+
+from sqlalchemy import text
+
+from database import engine
+from models import INVESTOR_SEARCH_TEXT_COLUMNS
+
+TABLE = "bench_investors"
+WORDS = ["Capital", "Ventures", "Partners", "Growth", "Seed", "Fintech", "Health",
+         "Labs", "Holdings", "Angel", "Fund", "Equity", "Frontier", "Summit"]
+# A common word, a less common one, a substring in the middle of a word, an email fragment, a miss
+TERMS = ["capital", "frontier", "entur", "@fund12.", "no-such-investor"]
+
+
+def fill(conn, rows: int) -> None:
+    words = "ARRAY[" + ", ".join(f"'{word}'" for word in WORDS) + "]"
+    columns = [column for column in INVESTOR_SEARCH_TEXT_COLUMNS if column not in ("email", "external_id")]
+    values = [
+        f"'{column}-' || ({words})[1 + abs(hashtext(i::text || '{column}')) % {len(WORDS)}]"
+        f" || ' ' || substr(md5(i::text || '{column}'), 1, 8)"
+        for column in columns
+    ]
+    conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+    conn.execute(text(f"CREATE TABLE {TABLE} (LIKE investors INCLUDING ALL)"))
+    conn.execute(text(
+        f"INSERT INTO {TABLE} (id, email, external_id, {', '.join(columns)}) "
+        f"SELECT i, 'person' || i || '@fund' || (i % 500) || '.com', 'ext-' || i, {', '.join(values)} "
+        f"FROM generate_series(1, :rows) AS i"
+    ), {"rows": rows})
+    conn.execute(text(f"ANALYZE {TABLE}"))
+
+
+def best_of(conn, sql: str, params: dict, repeat: int):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = conn.execute(text(sql), params).all()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def bench(conn, repeat: int) -> None:
+    predicates = {
+        "OR of ILIKE": " OR ".join(f"{column} ILIKE :pattern" for column in INVESTOR_SEARCH_TEXT_COLUMNS),
+        "search_text": "search_text ILIKE :pattern",
+    }
+    for term in TERMS:
+        params = {"pattern": f"%{term}%"}
+        counts = {}
+        for label, predicate in predicates.items():
+            count_time, count = best_of(conn, f"SELECT count(*) FROM {TABLE} WHERE {predicate}", params, repeat)
+            page_time, _ = best_of(
+                conn, f"SELECT * FROM {TABLE} WHERE {predicate} ORDER BY id LIMIT 100", params, repeat
+            )
+            counts[label] = count[0][0]
+            print(f"{term!r:<20} {label:<12} matches {counts[label]:>8}   "
+                  f"count {count_time * 1000:9.1f} ms   page {page_time * 1000:9.1f} ms")
+        assert len(set(counts.values())) == 1, f"predicates disagree for {term!r}: {counts}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--keep", action="store_true", help="keep bench_investors afterwards")
+    args = parser.parse_args()
+
+    with engine.connect() as conn:
+        started = time.perf_counter()
+        fill(conn, args.rows)
+        conn.commit()
+        print(f"filled {TABLE} with {args.rows} rows in {time.perf_counter() - started:.1f} s")
+        try:
+            bench(conn, args.repeat)
+        finally:
+            if not args.keep:
+                conn.rollback()
+                conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+                conn.commit()
@@ -0,0 +1,91 @@
+"""Encoding cost of the previous response path vs FastJSONResponse.
+
+    python -m scripts.bench_json_responses
+    python -m scripts.bench_json_responses --url http://localhost:8000 --token <jwt> --list-id 1
+
+Without --url, payloads shaped like /investors/search (one 100-row page) and
+/lists/{id}/items (a large list) are encoded both ways in-process: before is
+jsonable_encoder + stdlib json (what FastAPI did for plain dicts), after is
+FastJSONResponse rendering directly. With --url, the two endpoints of a
+running API are timed end to end."""
+import argparse
+import statistics
+import time
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import serializers
+from responses import FastJSONResponse
+from scripts.bench_serializers import synthetic_investor
+
+
+def investor_rows(count: int) -> list:
+    # Rows as the endpoints return them, i.e. already through the serializer
+    return [serializers.investor(synthetic_investor(i)) for i in range(count)]
+
+
+def search_payload(rows: int) -> dict:
+    return {
+        "total": 48213, "page": 1, "per_page": rows, "total_pages": -(-48213 // rows),
+        "count_mode": "exact", "next_cursor": "WzEwMF0",
+        "results": investor_rows(rows),
+    }
+
+
+def list_items_payload(items: int) -> dict:
+    investors = investor_rows(items)
+    return {
+        "list_id": 1, "list_name": "Seed funds", "list_type": "investor", "total_items": items,
+        "items": {"investors": {"count": items, "data": investors}, "funds": {"count": 0, "data": []}},
+    }
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench_encoding(label: str, payload: dict, repeat: int) -> None:
+    before = best_of(lambda: JSONResponse(jsonable_encoder(payload)).body, repeat)
+    after = best_of(lambda: FastJSONResponse(payload).body, repeat)
+    print(f"{label:<28} before {before * 1000:8.2f} ms   after {after * 1000:7.2f} ms   "
+          f"speedup {before / after:5.1f}x")
+
+
+def bench_http(url: str, token: str, list_id: int, repeat: int) -> None:
+    headers = {"Authorization": f"Bearer {token}"}
+    endpoints = [
+        ("/investors/search", f"{url}/api/v1/investors/search?per_page=100&countries=United%20States"),
+        (f"/lists/{list_id}/items", f"{url}/api/v1/lists/{list_id}/items"),
+    ]
+    with httpx.Client(headers=headers, timeout=30) as client:
+        for label, endpoint in endpoints:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                client.get(endpoint).raise_for_status()
+                timings.append(time.perf_counter() - started)
+            print(f"{label:<28} median {statistics.median(timings) * 1000:8.2f} ms   "
+                  f"p95 {sorted(timings)[int(len(timings) * 0.95) - 1] * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url")
+    parser.add_argument("--token")
+    parser.add_argument("--list-id", type=int, default=1)
+    parser.add_argument("--list-items", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.url:
+        bench_http(args.url.rstrip('/'), args.token, args.list_id, args.repeat)
+    else:
+        bench_encoding("/investors/search (100)", search_payload(100), args.repeat)
+        bench_encoding(f"/lists/{{id}}/items ({args.list_items})", list_items_payload(args.list_items), args.repeat)
@@ -0,0 +1,152 @@
+"""Planning time saved by keeping the hot statements prepared (DB_PREPARED_STATEMENTS).
+
+    python -m scripts.bench_prepared_statements
+    python -m scripts.bench_prepared_statements --repeat 1000 --term capital
+
+Runs the statements every request repeats: the user lookup of get_current_user,
+the investor detail fetch of CRUDBase.get and a first search page. It runs them
+against the database in ASYNC_DATABASE_URL and reports:
+
+  planning  Postgres' own "Planning Time" from EXPLAIN ANALYZE. Each statement
+            is explained as a fresh statement, which is planned every time, and
+            as EXECUTE of a PREPAREd one. The first five executions of a prepared
+            statement are planned with their values (custom plans) and are
+            skipped, after which Postgres may switch to the cached generic plan
+  latency   mean wall time per execution through the app's asyncpg engine in
+            each DB_PREPARED_STATEMENTS mode (off, cache, pgbouncer)
+
+Needs at least one user and one investor. A prepared statement only saves
+planning once Postgres settles on the generic plan; DB_PLAN_CACHE_MODE=force_generic_plan
+makes that happen from the first execution."""
+import argparse
+import asyncio
+import json
+import time
+
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import models
+import schemas
+import search
+from database import ASYNC_DATABASE_URL, asyncpg_connect_args
+
+MODES = ["off", "cache", "pgbouncer"]
+CUSTOM_PLAN_EXECUTIONS = 5
+
+
+def hot_queries(user_id: int, investor_id: int, term: str) -> dict:
+    """The per-request statements, each as a coroutine function of an AsyncConnection"""
+    async def user_lookup(conn):
+        await conn.execute(select(models.User).where(models.User.id == user_id))
+
+    async def investor_detail(conn):
+        await conn.execute(select(models.Investor).where(models.Investor.id == investor_id).limit(1))
+
+    async def investor_search(conn):
+        plan = search.SearchPlan(models.Investor, {"search_term": term, "search_mode": schemas.SearchMode.CONTAINS})
+        await conn.run_sync(plan.fetch_page, 50)
+
+    return {"get_current_user": user_lookup, "CRUDBase.get": investor_detail, "search page": investor_search}
+
+
+async def capture_statement(engine, conn, query):
+    """The SQL and positional parameters the query sends through asyncpg"""
+    captured = []
+
+    def before_execute(sync_conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, tuple(parameters)))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_execute)
+    try:
+        await query(conn)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", before_execute)
+    return captured[-1]
+
+
+def planning_ms(explain_json) -> float:
+    plan = json.loads(explain_json) if isinstance(explain_json, str) else explain_json
+    return plan[0]["Planning Time"]
+
+
+def sql_literal(value) -> str:
+    """A captured parameter written into EXECUTE, which takes values rather than bind parameters"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+async def measure_planning(raw, sql: str, params: tuple, repeat: int):
+    """Mean planning time (ms) of the statement unprepared and prepared"""
+    unprepared = []
+    for _ in range(repeat):
+        unprepared.append(planning_ms(await raw.fetchval(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", *params)))
+
+    await raw.execute(f"PREPARE bench_hot AS {sql}")
+    try:
+        values = ", ".join(sql_literal(value) for value in params)
+        execute = f"EXECUTE bench_hot({values})" if params else "EXECUTE bench_hot"
+        prepared = []
+        for _ in range(repeat + CUSTOM_PLAN_EXECUTIONS):
+            prepared.append(planning_ms(await raw.fetchval(f"EXPLAIN (ANALYZE, FORMAT JSON) {execute}")))
+    finally:
+        await raw.execute("DEALLOCATE bench_hot")
+    prepared = prepared[CUSTOM_PLAN_EXECUTIONS:]
+    return sum(unprepared) / len(unprepared), sum(prepared) / len(prepared)
+
+
+async def measure_latency(mode: str, queries: dict, repeat: int) -> dict:
+    engine = create_async_engine(ASYNC_DATABASE_URL, pool_size=1, connect_args=asyncpg_connect_args(mode))
+    timings = {}
+    try:
+        async with engine.connect() as conn:
+            for name, query in queries.items():
+                for _ in range(10):
+                    await query(conn)
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    await query(conn)
+                timings[name] = (time.perf_counter() - started) / repeat * 1000
+                await conn.rollback()
+    finally:
+        await engine.dispose()
+    return timings
+
+
+async def main(args) -> None:
+    # asyncpg's own statement cache off as well, so every EXPLAIN is sent as a new statement
+    engine = create_async_engine(
+        ASYNC_DATABASE_URL, pool_size=1, connect_args=asyncpg_connect_args("off", statement_cache_size=0)
+    )
+    try:
+        async with engine.connect() as conn:
+            user_id = (await conn.execute(select(func.min(models.User.id)))).scalar()
+            investor_id = (await conn.execute(select(func.min(models.Investor.id)))).scalar()
+            if user_id is None or investor_id is None:
+                raise SystemExit("Needs at least one user and one investor")
+            queries = hot_queries(user_id, investor_id, args.term)
+
+            raw = (await conn.get_raw_connection()).driver_connection
+            print(f"planning time per execution, mean of {args.repeat} (ms)")
+            print(f"  {'statement':<18} {'unprepared':>10} {'prepared':>10} {'saved':>10}")
+            for name, query in queries.items():
+                sql, params = await capture_statement(engine, conn, query)
+                await conn.rollback()
+                unprepared, prepared = await measure_planning(raw, sql, params, args.repeat)
+                print(f"  {name:<18} {unprepared:10.3f} {prepared:10.3f} {unprepared - prepared:10.3f}")
+    finally:
+        await engine.dispose()
+
+    print(f"\nwall time per execution through the asyncpg engine, mean of {args.repeat} (ms)")
+    print(f"  {'statement':<18} " + " ".join(f"{mode:>10}" for mode in MODES))
+    results = {mode: await measure_latency(mode, queries, args.repeat) for mode in MODES}
+    for name in queries:
+        print(f"  {name:<18} " + " ".join(f"{results[mode][name]:10.3f}" for mode in MODES))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--term", default="capital", help="search term of the search page statement")
+    asyncio.run(main(parser.parse_args()))
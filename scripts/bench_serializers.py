@@ -0,0 +1,95 @@
+"""Micro-benchmark: CRUDBase.to_dict on ORM instances vs serializers on result mappings.
+
+    python -m scripts.bench_serializers             # synthetic rows, no database needed
+    python -m scripts.bench_serializers --database  # rows read from DATABASE_URL
+
+The synthetic run measures conversion only. The database run measures a full
+page fetch both ways: ORM query + to_dict vs Core select + .mappings() + serializer."""
+import argparse
+import random
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+
+import crud
+import models
+import serializers
+from database import SessionLocal
+
+INDUSTRIES = ["Software", "Fintech", "Healthcare", "AI", "Consumer", "Energy", "Biotech"]
+STAGES = ["Pre-Seed", "Seed", "Series A", "Series B", "Growth"]
+
+
+def synthetic_investor(i: int) -> dict:
+    return {
+        "id": i, "prefix": None, "first_name": f"First{i}", "last_name": f"Last{i}", "gender": "Female",
+        "contact_title": "Partner", "email": f"person{i}@fund{i % 500}.com", "phone": "+1 555 0100",
+        "address": "1 Main St", "office_website": f"https://fund{i % 500}.com", "firm_name": f"Fund {i % 500}",
+        "city": "New York", "state": "NY", "country": "United States", "type_of_firm": "Venture Capital",
+        "type_of_financing": ["Equity"],
+        "industry_preferences": random.sample(INDUSTRIES, 3),
+        "geographic_preferences": ["US", "Europe"],
+        "stage_preferences": random.sample(STAGES, 2),
+        "capital_managed": float('nan') if i % 7 == 0 else random.uniform(1e6, 1e9),
+        "min_investment": random.uniform(1e5, 1e6), "max_investment": None,
+        "number_of_investors": float(i % 40),
+        "external_id": None, "version": 1 + i % 3, "updated_at": datetime(2024, 1, 1, tzinfo=timezone.utc),
+    }
+
+
+def timed(label: str, fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:<40} {best * 1000:8.3f} ms")
+    return best
+
+
+def bench_synthetic(rows: int, repeat: int) -> None:
+    records = [synthetic_investor(i) for i in range(rows)]
+    instances = [models.Investor(**record) for record in records]
+    to_dict = crud.investor.to_dict
+    serializer = serializers.investor
+
+    assert [to_dict(obj) for obj in instances] == serializer.many(records), "outputs differ"
+
+    before = timed(f"to_dict x {rows}", lambda: [to_dict(obj) for obj in instances], repeat)
+    after = timed(f"RowSerializer x {rows}", lambda: serializer.many(records), repeat)
+    print(f"speedup: {before / after:.1f}x")
+
+
+def bench_database(rows: int, repeat: int) -> None:
+    serializer = serializers.investor
+    columns = [getattr(models.Investor, name) for name in serializer.fields]
+
+    def orm_page():
+        with SessionLocal() as db:
+            query = db.query(models.Investor).order_by(models.Investor.id).limit(rows)
+            return [crud.investor.to_dict(obj) for obj in query]
+
+    def core_page():
+        with SessionLocal() as db:
+            result = db.execute(select(*columns).order_by(models.Investor.id).limit(rows))
+            return [serializer(row) for row in result.mappings()]
+
+    assert orm_page() == core_page(), "outputs differ"
+
+    before = timed(f"ORM + to_dict, {rows} rows", orm_page, repeat)
+    after = timed(f"Core mappings + serializer, {rows} rows", core_page, repeat)
+    print(f"speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", action="store_true", help="read rows from the database")
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.database:
+        bench_database(args.rows, args.repeat)
+    else:
+        bench_synthetic(args.rows, args.repeat)
@@ -9,11 +9,14 @@ import sqlalchemy
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
-from database import engine
+import arrays
+import cache
+from database import engine, create_extensions
 from models import Base, Investor, InvestmentFund
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+create_extensions(bind=engine)
 Base.metadata.create_all(bind=engine)
 
 logging.basicConfig(
@@ -102,18 +105,8 @@ def convert_currency(value):
 
 
 def clean_list_field(value):
-    if pd.isna(value) or value in ('', '[""]'):
-        return None
     try:
-        if isinstance(value, str):
-            value = value.strip('[]').replace('"', '').replace("'", '')
-            items = [item.strip() for item in value.split(',')]
-            items = list(set(item for item in items if item))
-            return items if items else None
-        elif isinstance(value, list):
-            items = [str(item).strip() for item in value if item]
-            return list(set(items)) if items else None
-        return None
+        return arrays.normalize(value)
     except Exception as e:
         logger.error(f"List cleaning error for {value}: {str(e)}")
         return None
@@ -190,6 +183,8 @@ def import_data(csv_file: str, model: Type[Union[Investor, InvestmentFund]], ses
             if records_processed % 100 == 0:
                 logger.info(f"Processed {records_processed} records. Errors: {errors}")
 
+    cache.notify_table_changed(model.__tablename__)
+
     logger.info(f"\nImport completed for {model.__name__}:")
     logger.info(f"Total records processed: {records_processed}")
     logger.info(f"Total errors: {errors}")
@@ -0,0 +1,244 @@
+import logging
+import re
+
+from sqlalchemy import text
+
+from database import engine
+from buckets import BUCKETED_COLUMNS, bucket_column, bucket_sql
+from models import (INVESTOR_SEARCH_DOCUMENT, FUND_SEARCH_DOCUMENT, INVESTOR_FULL_NAME,
+                    INVESTOR_SEARCH_TEXT_COLUMNS, FUND_SEARCH_TEXT_COLUMNS, BUMP_ROW_VERSION_FUNCTION,
+                    COUNT_ROWS_FUNCTION, count_rows_triggers, row_version_trigger, search_text_sql)
+from scripts.normalize_arrays import normalize_arrays
+from row_counts import COUNTED_TABLES
+
+logger = logging.getLogger(__name__)
+
+# Array columns filtered with && (GIN) and scalar columns filtered with IN (B-tree)
+ARRAY_FILTER_COLUMNS = {
+    "investors": ["type_of_financing", "industry_preferences", "geographic_preferences", "stage_preferences"],
+    "investment_funds": ["financing_type", "industry_preferences", "geographic_preferences", "stage_preferences"],
+}
+SCALAR_FILTER_COLUMNS = {
+    "investors": ["city", "state", "country", "type_of_firm", "contact_title"],
+    "investment_funds": ["firm_city", "firm_state", "firm_country", "firm_type", "gender_ratio"],
+}
+
+# Versioned schema changes that Base.metadata.create_all() cannot apply to
+# tables that already exist. Append new entries; never edit applied ones.
+# Entries are (version, description, statements) and may add a fourth element,
+# False, to run outside a transaction, which CREATE INDEX CONCURRENTLY requires.
+# Such migrations must be safe to re-run after failing part way. A statement
+# may also be a function taking the connection, for data migrations.
+MIGRATIONS = [
+    (
+        1,
+        "Add weighted full-text search vectors to investors and investment_funds",
+        [
+            "ALTER TABLE investors ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS ({INVESTOR_SEARCH_DOCUMENT}) STORED",
+            "CREATE INDEX IF NOT EXISTS ix_investors_search_vector ON investors USING gin (search_vector)",
+            "ALTER TABLE investment_funds ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS ({FUND_SEARCH_DOCUMENT}) STORED",
+            "CREATE INDEX IF NOT EXISTS ix_investment_funds_search_vector "
+            "ON investment_funds USING gin (search_vector)",
+        ],
+    ),
+    (
+        2,
+        "Add trigram indexes for firm and contact name autocomplete",
+        [
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            "ALTER TABLE investors ADD COLUMN IF NOT EXISTS full_name varchar "
+            f"GENERATED ALWAYS AS ({INVESTOR_FULL_NAME}) STORED",
+            "CREATE INDEX IF NOT EXISTS ix_investors_firm_name_trgm ON investors USING gin (firm_name gin_trgm_ops)",
+            "CREATE INDEX IF NOT EXISTS ix_investors_full_name_trgm ON investors USING gin (full_name gin_trgm_ops)",
+            "CREATE INDEX IF NOT EXISTS ix_investment_funds_firm_name_trgm "
+            "ON investment_funds USING gin (firm_name gin_trgm_ops)",
+            "CREATE INDEX IF NOT EXISTS ix_investment_funds_full_name_trgm "
+            "ON investment_funds USING gin (full_name gin_trgm_ops)",
+        ],
+    ),
+    (
+        3,
+        "Add indexed range bucket columns for the numeric search filters",
+        [
+            statement
+            for table in ("investors", "investment_funds")
+            for column in BUCKETED_COLUMNS
+            for statement in (
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {bucket_column(column)} smallint "
+                f"GENERATED ALWAYS AS ({bucket_sql(column)}) STORED",
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_{bucket_column(column)} ON {table} ({bucket_column(column)})",
+            )
+        ],
+    ),
+    (
+        4,
+        "Index the array and scalar search filter columns",
+        [
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_{column} ON {table} USING gin ({column})"
+            for table, columns in ARRAY_FILTER_COLUMNS.items()
+            for column in columns
+        ] + [
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_{column} ON {table} ({column})"
+            for table, columns in SCALAR_FILTER_COLUMNS.items()
+            for column in columns
+        ],
+        False,
+    ),
+    (
+        5,
+        "Add external_id upsert keys for bulk sync",
+        [
+            statement
+            for table in ("investors", "investment_funds")
+            for statement in (
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS external_id varchar",
+                f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_external_id ON {table} (external_id)",
+            )
+        ],
+        False,
+    ),
+    (
+        6,
+        "Add trigram-indexed search_text columns for generic text search",
+        [
+            # Adding a stored generated column rewrites the table under an exclusive lock
+            statement
+            for table, columns in (("investors", INVESTOR_SEARCH_TEXT_COLUMNS),
+                                   ("investment_funds", FUND_SEARCH_TEXT_COLUMNS))
+            for statement in (
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_text text "
+                f"GENERATED ALWAYS AS ({search_text_sql(columns)}) STORED",
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_search_text_trgm "
+                f"ON {table} USING gin (search_text gin_trgm_ops)",
+            )
+        ],
+        False,
+    ),
+    (
+        7,
+        "Normalize stored array values (split legacy '{a,b}' strings, trim, de-duplicate)",
+        [normalize_arrays],
+    ),
+    (
+        8,
+        "Add row version and updated_at columns maintained by an UPDATE trigger",
+        [BUMP_ROW_VERSION_FUNCTION] + [
+            statement
+            for table in ("investors", "investment_funds")
+            for statement in [
+                # Constant and stable defaults are stored in the catalog, without a table rewrite
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1",
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now()",
+            ] + row_version_trigger(table)
+        ],
+    ),
+    (
+        9,
+        "Keep row totals in row_counts with statement-level insert/delete/truncate triggers",
+        [
+            "CREATE TABLE IF NOT EXISTS row_counts ("
+            "table_name varchar PRIMARY KEY, row_count bigint NOT NULL, reconciled_at timestamptz)",
+            COUNT_ROWS_FUNCTION,
+        ] + [
+            statement
+            for table in COUNTED_TABLES
+            for statement in count_rows_triggers(table) + [
+                # CREATE TRIGGER locks out writers until commit, so the seed count
+                # and the triggers start from the same rows
+                f"INSERT INTO row_counts (table_name, row_count, reconciled_at) "
+                f"SELECT '{table}', count(*), now() FROM {table} "
+                f"ON CONFLICT (table_name) DO UPDATE "
+                f"SET row_count = EXCLUDED.row_count, reconciled_at = EXCLUDED.reconciled_at",
+            ]
+        ],
+    ),
+    (
+        10,
+        "Spread row_counts updates over per-backend shards so concurrent writers do not queue on one row",
+        [
+            "CREATE TABLE IF NOT EXISTS row_count_shards ("
+            "table_name varchar NOT NULL, shard smallint NOT NULL, delta bigint NOT NULL, "
+            "PRIMARY KEY (table_name, shard))",
+            COUNT_ROWS_FUNCTION,
+        ],
+    ),
+]
+
+_CONCURRENT_INDEX = re.compile(r"CREATE (?:UNIQUE )?INDEX CONCURRENTLY IF NOT EXISTS (\w+)", re.IGNORECASE)
+
+
+def get_applied_versions(conn) -> set:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL DEFAULT now())"
+    ))
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def drop_invalid_index(conn, statement: str) -> None:
+    """An interrupted CREATE INDEX CONCURRENTLY leaves an invalid index behind that
+    IF NOT EXISTS would silently keep; drop it so the statement rebuilds it"""
+    match = _CONCURRENT_INDEX.match(statement)
+    if not match:
+        return
+    name = match.group(1)
+    invalid = conn.execute(text(
+        "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND NOT i.indisvalid"
+    ), {"name": name}).first()
+    if invalid:
+        logger.warning(f"Dropping invalid index {name} left by an interrupted build")
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+
+def record_migration(conn, version: int, description: str) -> None:
+    conn.execute(
+        text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+        {"version": version, "description": description}
+    )
+
+
+def run_migrations(bind=engine) -> int:
+    """Apply pending migrations in version order, each in its own transaction
+    unless marked non-transactional. Returns the number of migrations applied"""
+    with bind.begin() as conn:
+        applied = get_applied_versions(conn)
+
+    count = 0
+    for version, description, statements, *options in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+
+        transactional = options[0] if options else True
+        logger.info(f"Applying migration {version}: {description}")
+        if transactional:
+            with bind.begin() as conn:
+                for statement in statements:
+                    if callable(statement):
+                        statement(conn)
+                    else:
+                        conn.execute(text(statement))
+                record_migration(conn, version, description)
+        else:
+            # Autocommit: each statement commits on its own and concurrent index
+            # builds do not block writes to the table while they run
+            with bind.connect() as conn:
+                conn.execution_options(isolation_level="AUTOCOMMIT")
+                for statement in statements:
+                    drop_invalid_index(conn, statement)
+                    logger.info(f"  {statement}")
+                    conn.execute(text(statement))
+                record_migration(conn, version, description)
+        count += 1
+
+    logger.info(f"Schema migrations complete. Applied {count} migration(s)")
+    return count
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_migrations()
@@ -0,0 +1,84 @@
+"""Rewrite array columns of investors and investment_funds into canonical form.
+
+    python -m scripts.normalize_arrays            # fix rows and print the report
+    python -m scripts.normalize_arrays --dry-run  # only report what would change
+
+Applies arrays.normalize to every stored array value: legacy single-element
+'{a,b}' strings are split, items are trimmed and de-duplicated and empty
+arrays become NULL. Migration 7 runs this once; running it again is safe and
+should report no fixed rows."""
+import argparse
+import logging
+from typing import Dict
+
+from sqlalchemy import ARRAY, bindparam, select, update
+
+import arrays
+from database import engine
+from models import Investor, InvestmentFund
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+def array_columns(model) -> list:
+    return [column for column in model.__table__.columns if isinstance(column.type, ARRAY)]
+
+
+def normalize_table(conn, model, dry_run: bool = False) -> Dict:
+    """Normalize one table on ``conn`` and return its report: rows scanned,
+    rows fixed and fixed values per column"""
+    table = model.__table__
+    columns = array_columns(model)
+    report = {"table": table.name, "rows": 0, "fixed_rows": 0, "fixed_values": {c.name: 0 for c in columns}}
+    # Bind names must differ from column names in UPDATE ... WHERE
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("row_id"))
+        .values({column.name: bindparam(f"new_{column.name}") for column in columns})
+    )
+
+    changes = []
+    result = conn.execute(
+        select(table.c.id, *columns).order_by(table.c.id), execution_options={"yield_per": BATCH_SIZE}
+    )
+    for row in result:
+        report["rows"] += 1
+        fixed = {column.name: arrays.normalize(row._mapping[column.name]) for column in columns}
+        changed = [name for name, value in fixed.items() if value != row._mapping[name]]
+        if not changed:
+            continue
+        report["fixed_rows"] += 1
+        for name in changed:
+            report["fixed_values"][name] += 1
+        changes.append(dict({f"new_{name}": value for name, value in fixed.items()}, row_id=row.id))
+        if len(changes) >= BATCH_SIZE and not dry_run:
+            conn.execute(stmt, changes)
+            changes = []
+
+    if changes and not dry_run:
+        conn.execute(stmt, changes)
+    return report
+
+
+def normalize_arrays(conn, dry_run: bool = False) -> list:
+    reports = [normalize_table(conn, model, dry_run) for model in (Investor, InvestmentFund)]
+    for report in reports:
+        logger.info(
+            f"{report['table']}: {report['fixed_rows']} of {report['rows']} rows "
+            f"{'need normalizing' if dry_run else 'normalized'} {report['fixed_values']}"
+        )
+    return reports
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="report without writing")
+    args = parser.parse_args()
+
+    with engine.connect() as conn:
+        normalize_arrays(conn, args.dry_run)
+        if not args.dry_run:
+            conn.commit()
@@ -0,0 +1,113 @@
+"""Recount the tables in row_counts and correct any drift.
+
+    python -m scripts.reconcile_row_counts                 # reconcile once and print the report
+    python -m scripts.reconcile_row_counts --dry-run       # only report drift
+    python -m scripts.reconcile_row_counts --interval 3600 # keep reconciling every hour
+
+The count_rows triggers keep row_counts (plus the deltas in row_count_shards)
+exact, so drift means something bypassed them: triggers disabled during a
+restore, session_replication_role = replica, or rows written before migration 9.
+Each table is counted in a REPEATABLE READ snapshot together with its stored
+total, and the difference is added to the row_counts row rather than
+overwriting it, so writes that commit while the count runs are neither lost nor
+counted twice. Nothing is locked.
+
+A table whose count_rows triggers are missing or disabled is reported and left
+alone: a counter nothing maintains would be wrong again after the next write.
+Enable them, or reinstall them with the statements of migration 9."""
+import argparse
+import logging
+import time
+from typing import Dict
+
+from sqlalchemy import func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+
+from database import engine
+from models import COUNT_ROWS_TRIGGERS, Base, RowCount
+from row_counts import COUNTED_TABLES, shard_total
+
+logger = logging.getLogger(__name__)
+
+# Enabled count_rows triggers on a table ('O' fires normally, 'A' always; 'D' is
+# disabled and 'R' fires only under session_replication_role = replica)
+ACTIVE_COUNT_TRIGGERS = text(
+    "SELECT count(*) FROM pg_trigger t JOIN pg_proc p ON p.oid = t.tgfoid "
+    "WHERE t.tgrelid = CAST(:table_name AS regclass) AND p.proname = 'count_rows' "
+    "AND t.tgenabled IN ('O', 'A') AND NOT t.tgisinternal"
+)
+
+
+def reconcile_table(table_name: str, dry_run: bool = False) -> Dict:
+    """Count one table and fix its counter; returns the counted and stored totals.
+    Writes nothing when the table's count_rows triggers are not all in place"""
+    table = Base.metadata.tables[table_name]
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="REPEATABLE READ")
+        with conn.begin():
+            counted = conn.execute(select(func.count()).select_from(table)).scalar_one()
+            base = conn.execute(
+                select(RowCount.row_count).where(RowCount.table_name == table_name)
+            ).scalar()
+            shards = conn.execute(select(shard_total(table_name))).scalar_one()
+            triggers = conn.execute(ACTIVE_COUNT_TRIGGERS, {"table_name": table_name}).scalar_one()
+
+    stored = None if base is None else base + shards
+    drift = counted - (stored or 0)
+    maintained = triggers == len(COUNT_ROWS_TRIGGERS)
+    report = {"table": table_name, "counted": counted, "stored": stored, "drift": drift, "maintained": maintained}
+    if dry_run or not maintained:
+        return report
+
+    with engine.begin() as conn:
+        if stored is None:
+            # No counter yet: start from the snapshot count. Rows written since the
+            # snapshot are picked up by the next run
+            conn.execute(
+                insert(RowCount)
+                .values(table_name=table_name, row_count=counted - shards, reconciled_at=func.now())
+                .on_conflict_do_nothing(index_elements=[RowCount.table_name])
+            )
+        else:
+            conn.execute(
+                update(RowCount)
+                .where(RowCount.table_name == table_name)
+                .values(row_count=RowCount.row_count + drift, reconciled_at=func.now())
+            )
+    return report
+
+
+def reconcile_row_counts(dry_run: bool = False) -> list:
+    reports = [reconcile_table(table_name, dry_run) for table_name in COUNTED_TABLES]
+    for report in reports:
+        if not report["maintained"]:
+            logger.error(
+                f"{report['table']}: count_rows triggers missing or disabled, counter left at "
+                f"{report['stored']} (counted {report['counted']}); enable or reinstall them (migration 9)"
+            )
+        elif report["drift"]:
+            logger.warning(
+                f"{report['table']}: counted {report['counted']}, stored {report['stored']} "
+                f"({'drift' if dry_run else 'corrected by'} {report['drift']:+d})"
+            )
+        else:
+            logger.info(f"{report['table']}: {report['counted']} rows, counter exact")
+    return reports
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="report without writing")
+    parser.add_argument("--interval", type=float, help="seconds between runs; runs once if omitted")
+    args = parser.parse_args()
+
+    if not args.interval:
+        reconcile_row_counts(args.dry_run)
+    else:
+        while True:
+            try:
+                reconcile_row_counts(args.dry_run)
+            except Exception as e:
+                logger.error(f"Reconciling row counts failed, retrying next run: {str(e)}")
+            time.sleep(args.interval)
@@ -1,5 +1,5 @@
 from sqlalchemy import create_engine, inspect
-from database import SQLALCHEMY_DATABASE_URL
+from database import SQLALCHEMY_DATABASE_URL, create_extensions
 from models import Base
 
 
@@ -15,6 +15,7 @@ def reset_database():
     print(f"Dropped tables: {', '.join(table_names)}")
 
     # Recreate all tables
+    create_extensions(bind=engine)
     Base.metadata.create_all(bind=engine)
     print("Recreated all tables.")
 
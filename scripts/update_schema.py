@@ -1,14 +1,20 @@
 from sqlalchemy import create_engine
-from database import SQLALCHEMY_DATABASE_URL
+from database import SQLALCHEMY_DATABASE_URL, create_extensions
 from models import Base
+from scripts.migrate import run_migrations
 
 
 def update_schema():
     engine = create_engine(SQLALCHEMY_DATABASE_URL)
 
+    create_extensions(bind=engine)
+
     # This will create tables that don't exist, but won't modify existing tables
     Base.metadata.create_all(bind=engine)
 
+    # Versioned migrations cover changes to tables that already exist
+    run_migrations(bind=engine)
+
     print("Database schema updated.")
 
 
@@ -0,0 +1,341 @@
+from collections import OrderedDict
+from sqlalchemy import func, select, literal, text, bindparam, or_
+from sqlalchemy.orm import Session
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import buckets
+import models
+import pagination
+import row_counts
+import schemas
+import serializers
+import re
+import threading
+
+# Postgres text search configuration used by the generated search_vector columns
+SEARCH_CONFIG = 'simple'
+
+# Minimum pg_trgm word similarity for a name to be suggested; low enough to absorb typos
+SUGGEST_SIMILARITY_THRESHOLD = 0.3
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Declarative search filters: how each search parameter maps onto columns.
+#   equals:   scalar column IN (values)
+#   overlaps: array column && values
+#   ranges:   numeric column within any of the selected range labels (buckets.RANGE_LABELS),
+#             matched as <column>_bucket IN (buckets covering the labels)
+#   present:  has_<param> / no_<param> contact filters ("NaN" strings count as missing)
+#   text:     columns matched case-insensitively by search_term in contains mode
+INVESTOR_FILTERS = {
+    "equals": {
+        "cities": "city",
+        "states": "state",
+        "countries": "country",
+        "fund_types": "type_of_firm",
+        "title": "contact_title",
+        "gender": "gender",
+    },
+    "overlaps": {
+        "industries": "industry_preferences",
+        "geographic_preferences": "geographic_preferences",
+        "stages": "stage_preferences",
+    },
+    "ranges": {
+        "assets_under_management": "capital_managed",
+        "minimum_investment": "min_investment",
+        "maximum_investment": "max_investment",
+        "number_of_investors": "number_of_investors",
+    },
+    "present": {"email": "email", "phone": "phone", "address": "address"},
+    "text": ["first_name", "last_name", "firm_name"],
+}
+
+FUND_FILTERS = {
+    "equals": {
+        "cities": "firm_city",
+        "states": "firm_state",
+        "countries": "firm_country",
+        "fund_types": "firm_type",
+        "gender_ratio": "gender_ratio",
+    },
+    "overlaps": {
+        "industries": "industry_preferences",
+        "location_preferences": "geographic_preferences",
+        "stages": "stage_preferences",
+    },
+    "ranges": {
+        "assets_under_management": "capital_managed",
+        "minimum_investment": "min_investment",
+        "maximum_investment": "max_investment",
+        "number_of_investors": "number_of_investors",
+    },
+    "present": {"email": "contact_email", "phone": "contact_phone", "address": "firm_address"},
+    "text": ["firm_name", "contact_email", "firm_email"],
+}
+
+FILTER_SPECS = {
+    models.Investor.__tablename__: INVESTOR_FILTERS,
+    models.InvestmentFund.__tablename__: FUND_FILTERS,
+}
+
+
+def build_prefix_tsquery(search_term: Optional[str]) -> Optional[str]:
+    """Turn free text into a prefix-matching tsquery, e.g. 'acme cap' -> 'acme:* & cap:*'.
+    Returns None when the term has no searchable tokens"""
+    if not search_term:
+        return None
+    tokens = _TOKEN_PATTERN.findall(search_term.lower())
+    if not tokens:
+        return None
+    return ' & '.join(f"{token}:*" for token in tokens)
+
+
+def fulltext_rank(model, tsquery):
+    """Relevance of a row for ``tsquery``; sort descending for best matches first"""
+    return func.ts_rank(model.search_vector, func.to_tsquery(SEARCH_CONFIG, tsquery))
+
+
+def search_sort_keys(model, tsquery=None) -> list:
+    """Deterministic sort for search results: by relevance when ranking, then by id"""
+    if tsquery is not None:
+        return [(fulltext_rank(model, tsquery), True), (model.id, False)]
+    return [(model.id, False)]
+
+
+class StatementCache:
+    """LRU of prepared search statements keyed by filter shape, with hit/miss counters"""
+
+    def __init__(self, maxsize: int = 512):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._statements: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key: Tuple, build: Callable[[], Any]) -> Any:
+        with self._lock:
+            statement = self._statements.get(key)
+            if statement is not None:
+                self.hits += 1
+                self._statements.move_to_end(key)
+                return statement
+            self.misses += 1
+
+        statement = build()
+        with self._lock:
+            self._statements[key] = statement
+            while len(self._statements) > self.maxsize:
+                self._statements.popitem(last=False)
+        return statement
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._statements),
+                "max_size": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+statement_cache = StatementCache()
+
+
+class SearchPlan:
+    """A search request split into its filter shape and its bind values.
+
+    The shape records which filters are present and the contact filter
+    variant; everything else is a bound parameter. Statements are built once per shape and then reused from
+    statement_cache, so a request only binds values"""
+
+    def __init__(self, model, filters: Dict, fields: Optional[List[str]] = None):
+        self.model = model
+        self.spec = FILTER_SPECS[model.__tablename__]
+        # Pages select plain columns (see CRUDBase.resolve_fields), not ORM entities
+        self.fields = tuple(fields or serializers.serializable_columns(model))
+        self.tsquery = None
+        if filters.get("search_mode") == schemas.SearchMode.FULLTEXT:
+            self.tsquery = build_prefix_tsquery(filters.get("search_term"))
+
+        shape = []
+        params = {}
+
+        term = filters.get("search_term")
+        if self.tsquery:
+            shape.append(("search_term", "fulltext"))
+            params["tsquery"] = self.tsquery
+        elif term:
+            shape.append(("search_term", "contains"))
+            params["search_pattern"] = f"%{term}%"
+
+        for param in self.spec["present"]:
+            value = (filters.get(param) or '').lower()
+            if value in (f"has_{param}", f"no_{param}"):
+                shape.append((param, value[:value.index('_')]))
+
+        for kind in ("equals", "overlaps"):
+            for param in self.spec[kind]:
+                values = filters.get(param)
+                if values:
+                    shape.append((param,))
+                    params[f"f_{param}"] = [values] if isinstance(values, str) else list(values)
+
+        for param in self.spec["ranges"]:
+            labels = filters.get(param)
+            if labels:
+                shape.append((param,))
+                params[f"f_{param}"] = buckets.buckets_for_labels(labels)
+
+        self.shape = (model.__tablename__,) + tuple(shape)
+        self.params = params
+
+    @property
+    def filtered(self) -> bool:
+        return len(self.shape) > 1
+
+    def sort_keys(self) -> list:
+        return search_sort_keys(self.model, bindparam("tsquery") if self.tsquery else None)
+
+    def _build_filter_statement(self):
+        model = self.model
+        stmt = select(model)
+        for entry in self.shape[1:]:
+            param = entry[0]
+            if param == "search_term":
+                if entry[1] == "fulltext":
+                    ts_query = func.to_tsquery(SEARCH_CONFIG, bindparam("tsquery"))
+                    stmt = stmt.where(model.search_vector.op('@@')(ts_query))
+                else:
+                    pattern = bindparam("search_pattern")
+                    stmt = stmt.where(or_(*[getattr(model, c).ilike(pattern) for c in self.spec["text"]]))
+            elif param in self.spec["present"]:
+                col = getattr(model, self.spec["present"][param])
+                if entry[1] == "has":
+                    stmt = stmt.where(col.isnot(None), col != 'NaN')
+                else:
+                    stmt = stmt.where(or_(col.is_(None), col == 'NaN'))
+            elif param in self.spec["equals"]:
+                col = getattr(model, self.spec["equals"][param])
+                stmt = stmt.where(col.in_(bindparam(f"f_{param}", expanding=True)))
+            elif param in self.spec["overlaps"]:
+                col = getattr(model, self.spec["overlaps"][param])
+                stmt = stmt.where(col.overlap(bindparam(f"f_{param}", type_=col.type)))
+            elif param in self.spec["ranges"]:
+                col = getattr(model, buckets.bucket_column(self.spec["ranges"][param]))
+                stmt = stmt.where(col.in_(bindparam(f"f_{param}", expanding=True)))
+        return stmt
+
+    def filter_statement(self):
+        return statement_cache.get_or_build((self.shape, "filter"), self._build_filter_statement)
+
+    def count(self, db: Session) -> int:
+        if not self.filtered:
+            return row_counts.get(db, self.model)
+        stmt = statement_cache.get_or_build(
+            (self.shape, "count"),
+            lambda: select(func.count()).select_from(self.filter_statement().subquery())
+        )
+        return db.execute(stmt, self.params).scalar_one()
+
+    def estimate_count(self, db: Session) -> int:
+        return pagination.explain_row_estimate(db, self.filter_statement().params(**self.params))
+
+    def fetch_page(self, db: Session, per_page: int, skip: int = 0, cursor: Optional[str] = None):
+        """One page of matching rows (of the selected columns) in sort order,
+        plus the next page's cursor"""
+        return self._fetch_rows(db, per_page, skip, cursor, with_total=False)
+
+    def fetch_page_with_total(self, db: Session, per_page: int, skip: int = 0):
+        """Like fetch_page, but also returns the exact total from the same statement
+        via count(*) OVER (). A page past the end has no row to carry the total,
+        so it is then counted separately"""
+        rows, next_cursor = self._fetch_rows(db, per_page, skip, None, with_total=True)
+        if rows:
+            total = rows[0][-1]
+        else:
+            total = self.count(db) if skip else 0
+        return rows, next_cursor, total
+
+    def stream(self, db: Session, batch_size: int):
+        """Every matching row (of the selected columns) in sort order, yielded in
+        lists of up to ``batch_size``. Rows are read through a server-side cursor,
+        so only one batch is held in memory however many rows match"""
+        sort_keys = self.sort_keys()
+
+        def build():
+            stmt = self.filter_statement().with_only_columns(*[getattr(self.model, name) for name in self.fields])
+            return stmt.order_by(*[expr.desc() if descending else expr.asc() for expr, descending in sort_keys])
+
+        stmt = statement_cache.get_or_build((self.shape, "stream", self.fields), build)
+        result = db.execute(stmt, self.params, execution_options={"yield_per": batch_size})
+        try:
+            yield from result.partitions()
+        finally:
+            result.close()
+
+    def _fetch_rows(self, db: Session, per_page: int, skip: int, cursor: Optional[str], with_total: bool):
+        sort_keys = self.sort_keys()
+        params = dict(self.params, limit=per_page + 1)
+        if cursor:
+            for i, value in enumerate(pagination.decode_cursor(cursor, len(sort_keys))):
+                params[f"cursor_{i}"] = value
+            mode = "cursor"
+        elif skip:
+            params["offset"] = skip
+            mode = "offset"
+        else:
+            mode = "first"
+
+        width = len(self.fields)
+
+        def build():
+            stmt = self.filter_statement().with_only_columns(*[getattr(self.model, name) for name in self.fields])
+            stmt = stmt.add_columns(*[expr for expr, _ in sort_keys])
+            if with_total:
+                # Window functions run before LIMIT/OFFSET, so this is the full match count
+                stmt = stmt.add_columns(func.count().over().label("total"))
+            if mode == "cursor":
+                values = [bindparam(f"cursor_{i}") for i in range(len(sort_keys))]
+                stmt = stmt.where(pagination.keyset_condition(sort_keys, values))
+            stmt = stmt.order_by(*[expr.desc() if descending else expr.asc() for expr, descending in sort_keys])
+            if mode == "offset":
+                stmt = stmt.offset(bindparam("offset"))
+            return stmt.limit(bindparam("limit"))
+
+        stmt = statement_cache.get_or_build((self.shape, "page", mode, with_total, self.fields), build)
+        rows = db.execute(stmt, params).all()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        next_cursor = None
+        if has_more:
+            next_cursor = pagination.encode_cursor(rows[-1][width:width + len(sort_keys)])
+        return rows, next_cursor
+
+
+def suggest_names(db: Session, model, columns: Dict[str, object], term: str, limit: int = 10) -> List[Dict]:
+    """Typo-tolerant autocomplete over trigram-indexed name columns.
+
+    ``columns`` maps a suggestion type (e.g. "firm") to the column it is read from.
+    Returns the best ``limit`` distinct names across all columns with one id each"""
+    db.execute(text("SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"),
+               {"threshold": str(SUGGEST_SIMILARITY_THRESHOLD)})
+
+    suggestions = []
+    for suggestion_type, column in columns.items():
+        score = func.max(func.word_similarity(term, column)).label("score")
+        stmt = (
+            select(func.min(model.id).label("id"), column.label("name"), score)
+            .where(literal(term).op("<%")(column))
+            .group_by(column)
+            .order_by(score.desc(), column)
+            .limit(limit)
+        )
+        suggestions.extend(
+            {"id": row.id, "name": row.name, "type": suggestion_type, "score": round(row.score, 4)}
+            for row in db.execute(stmt)
+        )
+
+    suggestions.sort(key=lambda s: (-s["score"], s["name"]))
+    return suggestions[:limit]
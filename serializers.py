@@ -0,0 +1,66 @@
+from decimal import Decimal
+from operator import itemgetter
+from sqlalchemy import Float, Numeric
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+import math
+import models
+
+
+def serializable_columns(model) -> List[str]:
+    """Column names exposed by the API, in table order; generated columns are internal"""
+    return [column.name for column in model.__table__.columns if column.computed is None]
+
+
+def _float(value):
+    if isinstance(value, (float, Decimal)):
+        if math.isnan(value) or math.isinf(value):
+            return None
+        return float(value)
+    return value
+
+
+class RowSerializer:
+    """Converts result rows of one model into API dicts, identical to CRUDBase.to_dict.
+
+    The per-column work is decided once from the column types: values are
+    pulled with a single itemgetter and only float columns go through a
+    converter (arrays are stored normalized, see arrays.normalize). Use it
+    on Core result mappings (``.mappings()`` or ``row._mapping``) so no ORM
+    instances are built"""
+
+    def __init__(self, model, fields: Optional[Sequence[str]] = None):
+        self.model = model
+        self.fields = tuple(fields or serializable_columns(model))
+        columns = model.__table__.columns
+
+        self._get = itemgetter(*self.fields) if len(self.fields) > 1 else (lambda row: (row[self.fields[0]],))
+        self._converters: Tuple[Tuple[str, Callable], ...] = tuple(
+            (name, _float) for name in self.fields if isinstance(columns[name].type, (Float, Numeric))
+        )
+
+    def __call__(self, row: Mapping) -> Dict:
+        result = dict(zip(self.fields, self._get(row)))
+        for name, convert in self._converters:
+            result[name] = convert(result[name])
+        return result
+
+    def many(self, rows: Iterable) -> List[Dict]:
+        """Serialize Row objects or mappings"""
+        return [self(getattr(row, "_mapping", row)) for row in rows]
+
+
+_serializers: Dict[Tuple, RowSerializer] = {}
+
+
+def get_serializer(model, fields: Optional[Sequence[str]] = None) -> RowSerializer:
+    """Shared serializer for a model and sparse fieldset (None for every column)"""
+    key = (model.__tablename__, tuple(fields) if fields else None)
+    serializer = _serializers.get(key)
+    if serializer is None:
+        serializer = _serializers[key] = RowSerializer(model, fields)
+    return serializer
+
+
+# Full-row serializers are built at import time
+investor = get_serializer(models.Investor)
+investment_fund = get_serializer(models.InvestmentFund)
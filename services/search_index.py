@@ -0,0 +1,325 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+import buckets
+import cache
+import models
+import pagination
+import search
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Tables served from memory, using the same declarative filters as the SQL search
+SPECS = {
+    models.Investor.__tablename__: (models.Investor, search.INVESTOR_FILTERS),
+    models.InvestmentFund.__tablename__: (models.InvestmentFund, search.FUND_FILTERS),
+}
+
+# A failing refresh is retried after 1, 2, 4 and 8 seconds, then given up
+REFRESH_ATTEMPTS = 5
+REFRESH_BACKOFF_SECONDS = 1
+
+
+def indexed_columns(spec: Dict) -> List[str]:
+    """The columns a snapshot is built from: the id and every filtered column"""
+    columns = {"id"} | set(spec["text"])
+    for kind in ("equals", "overlaps", "ranges", "present"):
+        columns |= set(spec[kind].values())
+    return sorted(columns)
+
+
+class TextColumn:
+    """A text column lowercased and joined into one UTF-8 buffer, so a substring
+    search is a few vectorized passes over bytes rather than a Python loop over rows"""
+
+    def __init__(self, values: Iterable[Optional[str]]):
+        encoded = [(value or '').lower().encode() for value in values]
+        lengths = np.fromiter((len(value) + 1 for value in encoded), dtype=np.int64, count=len(encoded))
+        self.starts = np.cumsum(lengths) - lengths
+        # NUL-terminated, so no match spans two rows
+        self.buffer = np.frombuffer(b'\0'.join(encoded) + b'\0', dtype=np.uint8)
+        self.byte_counts = np.bincount(self.buffer, minlength=256)
+
+    def contains(self, needle: str) -> np.ndarray:
+        """Boolean mask of rows containing ``needle``, which must already be lowercase"""
+        pattern = np.frombuffer(needle.encode(), dtype=np.uint8)
+        # Start from the positions of the needle's rarest byte, then keep those
+        # where every other byte matches at its offset
+        anchor = int(np.argmin(self.byte_counts[pattern]))
+        starts = np.flatnonzero(self.buffer == pattern[anchor]) - anchor
+        starts = starts[(starts >= 0) & (starts <= len(self.buffer) - len(pattern))]
+        for offset, byte in enumerate(pattern):
+            if offset != anchor:
+                starts = starts[self.buffer[starts + offset] == byte]
+        mask = np.zeros(len(self.starts), dtype=bool)
+        mask[np.searchsorted(self.starts, starts, side="right") - 1] = True
+        return mask
+
+
+class ColumnarTable:
+    """Immutable NumPy snapshot of one table, indexed for the search filters.
+
+    Rows are held in id order, so a row's position doubles as its sort key.
+    Array columns get one packed bitmap per distinct value; scalar columns are
+    dictionary-encoded (comparing codes yields the same per-value bitmap without
+    storing one per city); numeric columns are reduced to their range bucket;
+    text columns are joined into a byte buffer. Only the filtered columns are
+    read and no row is kept: a search yields ids, and the page's rows are read
+    from the database"""
+
+    def __init__(self, model, spec: Dict, rows: List[Dict]):
+        self.model = model
+        self.spec = spec
+        self.size = len(rows)
+        self.ids = np.fromiter((r["id"] for r in rows), dtype=np.int64, count=self.size)
+        self.loaded_at = time.monotonic()
+        self.generation = 0
+
+        self.codes = {}
+        for column in spec["equals"].values():
+            self.codes[column] = self._encode(rows, column)
+
+        self.bitmaps = {}
+        for column in spec["overlaps"].values():
+            self.bitmaps[column] = self._build_bitmaps(rows, column)
+
+        self.range_buckets = {}
+        for column in spec["ranges"].values():
+            self.range_buckets[column] = np.fromiter(
+                (-1 if bucket is None else bucket for bucket in (buckets.bucket_of(r[column]) for r in rows)),
+                dtype=np.int16, count=self.size
+            )
+
+        self.present = {}
+        for column in spec["present"].values():
+            self.present[column] = np.fromiter(
+                (r[column] is not None and r[column] != 'NaN' for r in rows), dtype=bool, count=self.size
+            )
+
+        self.text = {column: TextColumn(r[column] for r in rows) for column in spec["text"]}
+
+    def _encode(self, rows: List[Dict], column: str) -> Tuple[Dict, np.ndarray]:
+        index = {}
+        codes = np.empty(self.size, dtype=np.int32)
+        for i, record in enumerate(rows):
+            value = record[column]
+            codes[i] = -1 if value is None else index.setdefault(value, len(index))
+        return index, codes
+
+    def _build_bitmaps(self, rows: List[Dict], column: str) -> Dict[str, np.ndarray]:
+        positions: Dict[str, List[int]] = {}
+        for i, record in enumerate(rows):
+            for value in set(record[column] or ()):
+                positions.setdefault(value, []).append(i)
+        bitmaps = {}
+        for value, rows in positions.items():
+            bits = np.zeros(self.size, dtype=bool)
+            bits[rows] = True
+            bitmaps[value] = np.packbits(bits)
+        return bitmaps
+
+    def _unpack(self, packed: np.ndarray) -> np.ndarray:
+        return np.unpackbits(packed, count=self.size).view(bool)
+
+    def match(self, filters: Dict) -> Optional[np.ndarray]:
+        """Boolean mask of rows matching ``filters``, or None if a filter cannot be
+        answered here and the query should go to Postgres instead"""
+        mask = np.ones(self.size, dtype=bool)
+
+        term = filters.get("search_term")
+        if term:
+            if any(c in term for c in models.ILIKE_SPECIAL_CHARACTERS + ('\0',)):
+                return None  # ILIKE wildcards or escapes; leave to the database
+            needle = term.lower()
+            matched = np.zeros(self.size, dtype=bool)
+            for column in self.text.values():
+                matched |= column.contains(needle)
+            mask &= matched
+
+        for param, column in self.spec["present"].items():
+            value = (filters.get(param) or '').lower()
+            if value == f"has_{param}":
+                mask &= self.present[column]
+            elif value == f"no_{param}":
+                mask &= ~self.present[column]
+
+        for param, column in self.spec["equals"].items():
+            values = filters.get(param)
+            if not values:
+                continue
+            index, codes = self.codes[column]
+            if isinstance(values, str):
+                values = [values]
+            wanted = [index[v] for v in values if v in index]
+            mask &= np.isin(codes, wanted)
+
+        for param, column in self.spec["overlaps"].items():
+            values = filters.get(param)
+            if not values:
+                continue
+            packed = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+            for value in values:
+                bitmap = self.bitmaps[column].get(value)
+                if bitmap is not None:
+                    packed |= bitmap
+            mask &= self._unpack(packed)
+
+        for param, column in self.spec["ranges"].items():
+            labels = filters.get(param)
+            if not labels:
+                continue
+            try:
+                wanted = buckets.buckets_for_labels(labels)
+            except ValueError:
+                return None
+            mask &= np.isin(self.range_buckets[column], wanted)
+
+        return mask
+
+    def page(self, mask: np.ndarray, per_page: int, skip: int = 0, cursor: Optional[str] = None) -> Dict:
+        matches = np.flatnonzero(mask)
+        total = len(matches)
+
+        if cursor:
+            last_id = pagination.decode_cursor(cursor, 1)[0]
+            start = int(np.searchsorted(self.ids[matches], last_id, side="right"))
+        else:
+            start = skip
+
+        window = matches[start:start + per_page + 1]
+        has_more = len(window) > per_page
+        window = window[:per_page]
+
+        next_cursor = pagination.encode_cursor([int(self.ids[window[-1]])]) if has_more else None
+        return {
+            "total": total,
+            "next_cursor": next_cursor,
+            "ids": self.ids[window].tolist(),
+        }
+
+
+class InMemorySearchIndex:
+    """Answers investor/fund searches from RAM when IN_MEMORY_SEARCH is enabled:
+    the filters, total and page ids come from memory, the page's rows from one
+    primary-key lookup.
+
+    Snapshots are rebuilt in the background after writes (see cache.register_listener)
+    and at least every IN_MEMORY_SEARCH_REFRESH_SECONDS, which also picks up writes
+    made by other workers and by the importer. Until a snapshot reflects the latest
+    write in this process, that table is searched in Postgres as before"""
+
+    def __init__(self):
+        self.enabled = os.getenv("IN_MEMORY_SEARCH", "false").lower() == "true"
+        self.max_age = float(os.getenv("IN_MEMORY_SEARCH_REFRESH_SECONDS", "300"))
+        self.tables: Dict[str, ColumnarTable] = {}
+        self._generations: Dict[str, int] = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        cache.register_listener(self.mark_stale)
+
+    def load(self, table: str) -> None:
+        model, spec = SPECS[table]
+        started = time.monotonic()
+        generation = self._generations.get(table, 0)
+        columns = [getattr(model, name) for name in indexed_columns(spec)]
+        db = SessionLocal()
+        try:
+            result = db.execute(select(*columns).order_by(model.id).execution_options(yield_per=5000))
+            rows = list(result.mappings())
+        finally:
+            db.close()
+
+        snapshot = ColumnarTable(model, spec, rows)
+        snapshot.generation = generation
+        with self._lock:
+            self.tables[table] = snapshot
+        logger.info(f"Loaded {snapshot.size} {table} rows into the search index "
+                    f"in {time.monotonic() - started:.2f}s")
+
+    def load_all(self) -> None:
+        for table in SPECS:
+            self.load(table)
+
+    def is_fresh(self, table: str) -> bool:
+        snapshot = self.tables.get(table)
+        return snapshot is not None and snapshot.generation == self._generations.get(table, 0)
+
+    def mark_stale(self, table: Optional[str]) -> None:
+        """Refresh hook for writes; also called by the importer via cache.notify_table_changed.
+        None, after the change listener lost its connection, means any table may have changed"""
+        if table is None:
+            for name in SPECS:
+                self.mark_stale(name)
+            return
+        if not self.enabled or table not in SPECS:
+            return
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+        self._refresh_in_background(table)
+
+    def _refresh_in_background(self, table: str) -> None:
+        with self._lock:
+            if table in self._refreshing:
+                return
+            self._refreshing.add(table)
+
+        def refresh():
+            loaded = False
+            failures = 0
+            while not loaded:
+                try:
+                    self.load(table)
+                    loaded = True
+                except Exception as e:
+                    failures += 1
+                    if failures >= REFRESH_ATTEMPTS:
+                        logger.error(f"Error refreshing search index for {table}, giving up after "
+                                     f"{failures} attempts: {str(e)}")
+                        break
+                    delay = REFRESH_BACKOFF_SECONDS * 2 ** (failures - 1)
+                    logger.error(f"Error refreshing search index for {table}, retrying in {delay}s: {str(e)}")
+                    time.sleep(delay)
+            with self._lock:
+                self._refreshing.discard(table)
+            # Writes that landed while loading need another pass. After giving up the
+            # table is searched in Postgres until the next write starts a new refresh
+            if loaded and not self.is_fresh(table):
+                self._refresh_in_background(table)
+
+        threading.Thread(target=refresh, name=f"search-index-{table}", daemon=True).start()
+
+    def search(
+            self,
+            model,
+            filters: Dict,
+            page: int,
+            per_page: int,
+            cursor: Optional[str] = None
+    ) -> Optional[Dict]:
+        """The ids of a search page in order, with the exact total and next_cursor,
+        answered from memory; None to fall back to SQL. The caller reads the rows"""
+        if not self.enabled:
+            return None
+
+        table = model.__tablename__
+        if not self.is_fresh(table):
+            return None
+        snapshot = self.tables[table]
+        if time.monotonic() - snapshot.loaded_at > self.max_age:
+            self._refresh_in_background(table)
+
+        mask = snapshot.match(filters)
+        if mask is None:
+            return None
+
+        return snapshot.page(mask, per_page, skip=(page - 1) * per_page, cursor=cursor)
+
+
+search_index = InMemorySearchIndex()
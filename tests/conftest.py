@@ -0,0 +1,34 @@
+import os
+import sys
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+# The modules live at the repository root and import each other by top-level name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+
+from database import SessionLocal  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """A session on DATABASE_URL, whose schema must be migrated; skips when it is unreachable"""
+    session = SessionLocal()
+    try:
+        session.execute(text("SELECT 1"))
+    except Exception as e:
+        session.close()
+        pytest.skip(f"Database unavailable: {e}")
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+
+
+@pytest.fixture
+def unique():
+    """A suffix that keeps a test's emails and external ids apart from existing rows"""
+    return uuid.uuid4().hex[:12]
@@ -0,0 +1,22 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import arrays
+
+
+@pytest.mark.parametrize("value", [None, math.nan, np.float64("nan"), pd.NA, pd.NaT])
+def test_missing_scalars_are_null(value):
+    assert arrays.normalize(value) is None
+
+
+def test_missing_items_are_dropped():
+    assert arrays.normalize(["saas", pd.NA, None, math.nan, pd.NaT, " fintech "]) == ["saas", "fintech"]
+
+
+def test_text_forms_are_split():
+    assert arrays.normalize('{saas,"b, c"}') == ["saas", "b, c"]
+    assert arrays.normalize('["a", "a", ""]') == ["a"]
+    assert arrays.normalize("seed, series a") == ["seed", "series a"]
@@ -0,0 +1,71 @@
+from sqlalchemy import delete, select
+
+import crud
+import models
+import schemas
+
+
+def upsert(db, records, key=schemas.BulkUpsertKey.EMAIL):
+    return crud.investor.bulk_upsert(db, records, schemas.InvestorBulkRecord, key)
+
+
+def stored(db, email):
+    return db.execute(select(models.Investor).where(models.Investor.email == email)).scalar_one()
+
+
+def test_partial_row_keeps_omitted_columns(db, unique):
+    email = f"partial-{unique}@example.com"
+    try:
+        upsert(db, [{
+            "first_name": "Ada", "last_name": "Byron", "email": email, "firm_name": "Analytical Capital",
+            "city": "London", "industry_preferences": ["fintech"], "external_id": f"ext-{unique}",
+        }])
+        result = upsert(db, [{"first_name": "Ada", "last_name": "Lovelace", "email": email}])
+
+        assert result["updated"] == 1
+        db.expire_all()
+        row = stored(db, email)
+        assert row.last_name == "Lovelace"
+        assert row.firm_name == "Analytical Capital"
+        assert row.city == "London"
+        assert row.industry_preferences == ["fintech"]
+        assert row.external_id == f"ext-{unique}"
+    finally:
+        db.execute(delete(models.Investor).where(models.Investor.email == email))
+        db.commit()
+
+
+def test_rows_sending_different_columns_in_one_batch(db, unique):
+    emails = [f"mixed{i}-{unique}@example.com" for i in range(3)]
+    try:
+        upsert(db, [{"first_name": "A", "last_name": "B", "email": email, "city": "Berlin"} for email in emails])
+        result = upsert(db, [
+            {"first_name": "A", "last_name": "B", "email": emails[0], "firm_name": "North"},
+            {"first_name": "A", "last_name": "B", "email": emails[1], "city": "Paris"},
+            {"first_name": "A", "last_name": "B", "email": emails[2]},
+        ])
+
+        assert result["updated"] == 3
+        db.expire_all()
+        assert (stored(db, emails[0]).firm_name, stored(db, emails[0]).city) == ("North", "Berlin")
+        assert (stored(db, emails[1]).firm_name, stored(db, emails[1]).city) == (None, "Paris")
+        assert stored(db, emails[2]).city == "Berlin"
+    finally:
+        db.execute(delete(models.Investor).where(models.Investor.email.in_(emails)))
+        db.commit()
+
+
+def test_partial_row_keyed_on_external_id(db, unique):
+    external_id = f"ext-{unique}"
+    try:
+        upsert(db, [{"first_name": "Grace", "last_name": "Hopper", "email": f"grace-{unique}@example.com",
+                     "city": "Arlington", "external_id": external_id}], schemas.BulkUpsertKey.EXTERNAL_ID)
+        upsert(db, [{"first_name": "Grace", "last_name": "Hopper", "email": f"grace-{unique}@example.com",
+                     "firm_name": "Cobol Ventures", "external_id": external_id}], schemas.BulkUpsertKey.EXTERNAL_ID)
+
+        db.expire_all()
+        row = stored(db, f"grace-{unique}@example.com")
+        assert (row.firm_name, row.city) == ("Cobol Ventures", "Arlington")
+    finally:
+        db.execute(delete(models.Investor).where(models.Investor.external_id == external_id))
+        db.commit()
@@ -0,0 +1,45 @@
+import pytest
+from sqlalchemy import create_engine, exc, text
+
+import pool_metrics
+from database import SQLALCHEMY_DATABASE_URL
+
+
+@pytest.fixture
+def metrics():
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_size=1, max_overflow=0, pool_timeout=0.2)
+    metrics = pool_metrics.PoolMetrics("test", max_overflow=0)
+    metrics.attach(engine)
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    except exc.OperationalError as e:
+        pytest.skip(f"Database unavailable: {e}")
+    yield metrics
+    engine.dispose()
+
+
+def test_checkout_waits_and_timeouts_are_counted(metrics):
+    engine = metrics.engine
+    with engine.connect():
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+        assert metrics.stats()["checked_out"] == 1
+
+    stats = metrics.stats()
+    # One of them by the fixture
+    assert stats["checkouts"] == 2
+    assert stats["timeouts"] == 1
+    assert stats["checkout_wait"]["max_ms"] >= 200
+    assert stats["checked_out_time"]["count"] == 2
+    assert stats["max_overflow"] == 0
+
+
+def test_metrics_follow_the_pool_dispose_creates(metrics):
+    engine = metrics.engine
+    engine.dispose()
+    with engine.connect():
+        assert metrics.stats()["checked_out"] == 1
+    stats = metrics.stats()
+    assert stats["checkouts"] == 2
+    assert stats["connects"] == 2
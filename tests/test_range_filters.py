@@ -0,0 +1,47 @@
+import asyncio
+
+import httpx
+import pytest
+
+import buckets
+import models
+import search
+from app import app
+from auth import get_current_user
+from database import dispose_engines
+
+app.dependency_overrides[get_current_user] = lambda: None
+
+
+def get(path, params):
+    async def request():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get(path, params=params)
+        # Pooled asyncpg connections belong to this event loop
+        await dispose_engines()
+        return response
+    return asyncio.run(request())
+
+
+def test_unknown_label_raises():
+    with pytest.raises(ValueError, match="Unknown range: lots"):
+        buckets.buckets_for_labels(["1 - 10", "lots"])
+    with pytest.raises(ValueError):
+        search.SearchPlan(models.InvestmentFund, {"assets_under_management": ["$1T+"]})
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/api/v1/investors/search", {"number_of_investors": "lots"}),
+    ("/api/v1/investors/search", {"assets_under_management": ["$100M+", "$1T+"]}),
+    ("/api/v1/funds/search", {"assets_under_management": "$1T+"}),
+    ("/api/v1/funds/search", {"minimum_investment": "cheap"}),
+])
+def test_unknown_label_is_a_bad_request(path, params):
+    response = get(path, params=params)
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Unknown range: ")
+
+
+def test_known_labels_are_accepted(db):
+    response = get("/api/v1/funds/search", params={"assets_under_management": ["$100M+", "$0 - $25M"]})
+    assert response.status_code == 200
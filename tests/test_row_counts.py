@@ -0,0 +1,30 @@
+import pytest
+from sqlalchemy import delete, insert, text
+
+import models
+import row_counts
+from models import ROW_COUNT_SHARDS
+
+
+def test_concurrent_writers_do_not_wait_on_the_counter(db, unique):
+    firm_name = f"counter-{unique}"
+    connection = db.get_bind().connect()
+    try:
+        # Neither session has committed, so both hold their counter row locks
+        shards = {c.execute(text(f"SELECT pg_backend_pid() % {ROW_COUNT_SHARDS}")).scalar() for c in (db, connection)}
+        if len(shards) == 1:
+            pytest.skip("Both backends hash to the same shard")
+        before = row_counts.get(db, models.InvestmentFund)
+        db.commit()
+        db.execute(insert(models.InvestmentFund).values(firm_name=firm_name))
+
+        connection.execute(text("SET LOCAL lock_timeout = '2s'"))
+        connection.execute(insert(models.InvestmentFund).values(firm_name=firm_name))
+        connection.commit()
+        db.commit()
+
+        assert row_counts.get(db, models.InvestmentFund) == before + 2
+    finally:
+        connection.close()
+        db.execute(delete(models.InvestmentFund).where(models.InvestmentFund.firm_name == firm_name))
+        db.commit()
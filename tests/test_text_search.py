@@ -0,0 +1,41 @@
+from sqlalchemy.dialects import postgresql
+
+import crud
+import models
+from services.search_index import SPECS, ColumnarTable, TextColumn, indexed_columns
+
+
+def condition_sql(term):
+    return str(crud.investor.text_search_condition(term).compile(dialect=postgresql.dialect()))
+
+
+def investor_table(firm_names):
+    spec = SPECS[models.Investor.__tablename__][1]
+    rows = [dict(dict.fromkeys(indexed_columns(spec)), id=i + 1, firm_name=name) for i, name in enumerate(firm_names)]
+    return ColumnarTable(models.Investor, spec, rows)
+
+
+def test_plain_term_uses_search_text():
+    assert "search_text" in condition_sql("capital")
+
+
+def test_ilike_special_terms_are_matched_column_by_column():
+    for term in ("100%", "first_round", "back\\slash"):
+        sql = condition_sql(term)
+        assert "search_text" not in sql
+        assert "investors.firm_name ILIKE" in sql
+
+
+def test_in_memory_index_leaves_ilike_special_terms_to_postgres():
+    table = investor_table(["Back\\slash Capital", "Acme Ventures"])
+    for term in ("100%", "first_round", "back\\slash"):
+        assert table.match({"search_term": term}) is None
+    assert table.match({"search_term": "acme"}).tolist() == [False, True]
+
+
+def test_text_column_matches_python_substring_search():
+    values = ["Acme Ventures", None, "", "Zürich Capital", "ventures", "aa", "Seed & Co"]
+    column = TextColumn(values)
+    for needle in ("ventures", "a", "aa", "aaa", "zür", "ich cap", "s", "& co", "missing"):
+        expected = [needle in (value or "").lower() for value in values]
+        assert column.contains(needle).tolist() == expected, needle